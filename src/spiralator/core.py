@@ -8,10 +8,13 @@ import sys
 from colorama import Fore, Back, Style
 import re
 import math
+import bisect
+import time
+import hashlib
 
-import pathlib
-from matplotlib.font_manager import FontProperties
-from matplotlib.textpath import TextPath
+from matplotlib.font_manager import FontProperties, findfont, get_font
+from matplotlib.textpath import TextPath, text_to_path
+from matplotlib.path import Path
 from matplotlib import get_data_path
 
 import matplotlib.pyplot as plt
@@ -165,18 +168,35 @@ def critical(msg:str):
 # Logger initialized
 #-----------------------------------------------------------
 
-def render_text(text, size=None, position=(0, 0), font_path=None, tolerance=0.1, layer=None):
+def nesting_candidates(poly, boxes:list, starts:list, num:int):
+	''' Returns the indices (ascending) of the first num outlines, given by their
+	bounding boxes and start points, that could contain the start of poly or
+	have their start inside poly. Other outlines cannot nest with poly. '''
 	
-	# Matplotlib requries pathlib.Path. Convert strings here.
-	if font_path is not None:
-		font_prop = pathlib.Path(font_path)
-	else:
-		font_prop = None
+	if num < 1:
+		return []
+	
+	bb = np.array(boxes[:num])
+	st = np.array(starts[:num])
+	p_min = poly.min(axis=0)
+	p_max = poly.max(axis=0)
+	
+	contains_poly = np.all((bb[:, :2] <= poly[0]) & (poly[0] <= bb[:, 2:]), axis=1)
+	inside_poly = np.all((p_min <= st) & (st <= p_max), axis=1)
+	
+	return np.flatnonzero(contains_poly | inside_poly).tolist()
+
+def path_polygons(path, tolerance=0.1, x_start:float=0):
+	''' Converts a matplotlib Path of closed outlines (such as a text path) to a
+	list of point arrays. Outlines inside a previous outline are subtracted
+	from it, so holes (such as the inside of an "O") are resolved. x_start is
+	the left edge of the text. '''
 	
-	path = TextPath(position, text, size=size, prop=font_prop)
 	polys = []
-	xmax = position[0]
-	for points, code in path.iter_segments():
+	boxes = []
+	starts = []
+	xmax = x_start
+	for points, code in path.iter_segments(simplify=False):
 		
 		if len(points) > 2:
 			
@@ -200,36 +220,801 @@ def render_text(text, size=None, position=(0, 0), font_path=None, tolerance=0.1,
 			
 			if poly.size > 0:
 				if poly[:, 0].min() < xmax:
-					i = len(polys) - 1
-					while i >= 0:
-						
-						if isinstance(poly[0], gdstk.Polygon):
-							poly = poly[0].points
+					
+					# Only check earlier outlines whose bounding boxes allow nesting
+					candidates = nesting_candidates(poly, boxes, starts, len(polys))
+					while len(candidates) > 0:
+						i = candidates.pop()
 						
 						if gdstk.inside(poly[:1], [polys[i]])[0]: # Ommited: , precision=0.1 * tolerance
 							p = polys.pop(i)
-							poly = gdstk.boolean([p],[poly],"xor",precision=0.1 * tolerance)
+							del boxes[i], starts[i]
+							poly = gdstk.boolean([p],[poly],"xor",precision=0.1 * tolerance)[0].points
 							break
 						elif gdstk.inside(polys[i][:1], [poly])[0]:  # Ommited: , precision=0.1 * tolerance
 							p = polys.pop(i)
-							poly = gdstk.boolean([p],[poly],"xor",precision=0.1 * tolerance)
-						i -= 1
-
+							del boxes[i], starts[i]
+							poly = gdstk.boolean([p],[poly],"xor",precision=0.1 * tolerance)[0].points
+							candidates = nesting_candidates(poly, boxes, starts, i)
 				
-				if isinstance(poly[0], gdstk.Polygon):
-					poly = poly[0].points
-					
-				xes = [ x_[0] for x_ in poly]
-				xmax = max(xmax, max(xes))
+				xmax = max(xmax, poly[:, 0].max())
 				polys.append(poly)
+				boxes.append((*poly.min(axis=0), *poly.max(axis=0)))
+				starts.append(poly[0])
+	
+	return polys
+
+# Glyph outlines, shared by all designs in the process. Maps (font_path, glyph,
+# size, tolerance) to the hole-resolved outlines of the glyph drawn at the
+# origin, as a list of read-only point arrays.
+glyph_cache = {}
+
+def glyph_polygons(font_path, glyph:str, verts, codes, size:float, tolerance:float):
+	''' Returns the hole-resolved outlines of a glyph, given its matplotlib path
+	(verts, codes) in font units. Outlines are calculated once and cached. '''
+	
+	key = (font_path, glyph, size, tolerance)
+	if key not in glyph_cache:
+		polys = path_polygons(Path(verts*size/text_to_path.FONT_SCALE, codes), tolerance=tolerance)
+		for p in polys:
+			p.setflags(write=False)
+		glyph_cache[key] = polys
+	
+	return glyph_cache[key]
+
+# Fonts, shared by all designs in the process. Maps a font name to a tuple of
+# the font file path, its FontProperties and its loaded FT2Font handle.
+font_registry = {}
+
+def register_font(name:str, font_path:str):
+	''' Loads a TrueType font and registers it under name, so that the name can be
+	passed to insert_text and render_text in place of the font path. The font
+	file is parsed once, here, so worker processes can call this at startup
+	to warm the registry. Returns False if the font cannot be loaded. '''
+	
+	try:
+		font = get_font(font_path)
+	except Exception as e:
+		error(f"Failed to load font '>{font_path}<' ({e}).")
+		return False
+	
+	font_registry[name] = (str(font_path), FontProperties(fname=font_path), font)
+	debug(f"Registered font '>{name}<' from '>{font_path}<'.")
+	return True
+
+def lookup_font(font=None):
+	''' Returns the (font file path, FontProperties, FT2Font) tuple for a registered
+	font name or a font file path. Fonts given by path are registered under
+	their path on first use. None selects matplotlib's default font. '''
+	
+	if font is None:
+		font = findfont(FontProperties())
+	
+	if font in font_registry:
+		return font_registry[font]
+	
+	font_path = os.path.abspath(font)
+	if font_path not in font_registry:
+		font_registry[font_path] = (font_path, FontProperties(fname=font_path), get_font(font_path))
+	
+	return font_registry[font_path]
+
+def layout_glyphs(text:str, size:float, font_path=None):
+	''' Lays out text with matplotlib's glyph layout (including kerning). Returns
+	the font file and a list of (glyph, verts, codes, x, y) with the glyph paths
+	in font units and glyph positions relative to the start of the baseline.
+	font_path is as in render_text(). '''
+	
+	font_file, font_prop, font = lookup_font(font_path)
+	font.set_size(text_to_path.FONT_SCALE, text_to_path.DPI)
+	glyph_info, glyph_map, _ = text_to_path.get_glyphs_with_font(font, text)
+	
+	scale = size/text_to_path.FONT_SCALE
+	glyphs = [(glyph, *glyph_map[glyph], x*scale, y*scale) for glyph, x, y, _ in glyph_info]
+	
+	return font_file, glyphs
+
+def render_text(text, size=None, position=(0, 0), font_path=None, tolerance=0.1, layer=None):
+	''' Renders text to a list of polygons. font_path can be the path of a
+	TrueType font file or the name of a font added with register_font(). '''
+	
+	# Math text and default sizes are drawn by matplotlib directly
+	if size is None or "$" in text:
+		font_prop = lookup_font(font_path)[1]
+		polys = path_polygons(TextPath(position, text, size=size, prop=font_prop), tolerance=tolerance, x_start=position[0])
+		return [gdstk.Polygon(p, layer=layer) for p in polys]
+	
+	# Lay out string, then place each cached glyph
+	font_file, glyphs = layout_glyphs(text, size, font_path)
 	
-	# Convert list of ndarrays to Polygons
 	PolyObjs = []
-	for p in polys:
-		PolyObjs.append(gdstk.Polygon(p, layer=layer))
+	for glyph, verts, codes, x, y in glyphs:
+		offset = (position[0] + x, position[1] + y)
+		for p in glyph_polygons(font_file, glyph, verts, codes, size, tolerance):
+			PolyObjs.append(gdstk.Polygon(p + offset, layer=layer))
 	
 	return PolyObjs
 
+# Glyph and text cells, shared by all designs in the process. Map the text
+# parameters to the cell (and for text, the bounding box of the text).
+glyph_cell_cache = {}
+text_cell_cache = {}
+
+# Engraved text cells are drawn on the grid gdstk's booleans snap to, and pad
+# the text's bounding box so no glyph touches the edge of the cutout.
+text_grid_um = 1e-3
+text_cell_margin_um = 1
+
+def glyph_cell(font_file:str, glyph:str, verts, codes, size:float, tolerance:float, layer:int):
+	''' Returns a gdstk Cell containing one glyph (see glyph_polygons()) drawn at
+	the origin. Cached by font, glyph, size, tolerance and layer. '''
+	
+	key = (font_file, glyph, size, tolerance, layer)
+	
+	if key not in glyph_cell_cache:
+		cell = gdstk.Cell(shared_cell_name("GLYPH", key))
+		for p in glyph_polygons(font_file, glyph, verts, codes, size, tolerance):
+			cell.add(gdstk.Polygon(p, layer=layer))
+		glyph_cell_cache[key] = cell
+	
+	return glyph_cell_cache[key]
+
+def text_cell(text:str, size:float, font_path=None, tolerance:float=0.1, layer:int=0, engrave:bool=False):
+	''' Returns a gdstk Cell containing one line of text, starting at the origin on
+	its baseline, and the bounding box of the text. Each glyph is placed as a
+	reference to a shared glyph cell (see glyph_cell()).
+	
+	If engrave is true, the cell instead holds the bounding box of the text,
+	padded by text_cell_margin_um, with the text removed. The text is merged and
+	snapped to text_grid_um before it is cut, so the cell has no overlapping
+	outlines. The text is engraved into a plane by cutting out the padded box
+	(see text_cell_cutout()) and placing the cell in its place.
+	
+	Returns (None, None) for text without any outlines. Cached by parameters. '''
+	
+	font_file = lookup_font(font_path)[0]
+	key = (text, size, font_file, tolerance, layer, engrave)
+	
+	if key not in text_cell_cache:
+		
+		polys = render_text(text, size=size, font_path=font_file, tolerance=tolerance, layer=layer)
+		if len(polys) < 1:
+			text_cell_cache[key] = (None, None)
+			return text_cell_cache[key]
+		
+		bb = polygons_bounding_box(polys)
+		if engrave:
+			polys = gdstk.boolean(polys, [], "or", precision=text_grid_um, layer=layer)
+		
+		cell = gdstk.Cell(shared_cell_name("TEXT", key))
+		
+		if engrave:
+			cell.add(*gdstk.boolean(text_cell_cutout(bb), polys, "not", layer=layer))
+		elif size is None or "$" in text:
+			cell.add(*polys)
+		else:
+			for glyph, verts, codes, x, y in layout_glyphs(text, size, font_file)[1]:
+				cell.add(gdstk.Reference(glyph_cell(font_file, glyph, verts, codes, size, tolerance, layer), (x, y)))
+		
+		text_cell_cache[key] = (cell, bb)
+	
+	return text_cell_cache[key]
+
+def text_cell_cutout(bb, origin=(0, 0), layer:int=0):
+	''' Returns the rectangle cut out of a plane for engraved text with bounding
+	box bb (see text_cell()), for a line starting at origin. '''
+	
+	return gdstk.rectangle((origin[0] + bb[0][0] - text_cell_margin_um, origin[1] + bb[0][1] - text_cell_margin_um), (origin[0] + bb[1][0] + text_cell_margin_um, origin[1] + bb[1][1] + text_cell_margin_um), layer=layer)
+
+def polygons_bounding_box(polygons:list, default_point=(0, 0)):
+	''' Returns the bounding box enclosing all polygons as ((x_min, y_min), (x_max, y_max)).
+	If the list is empty, a zero-size box at default_point is returned. '''
+	
+	if len(polygons) < 1:
+		return ((default_point[0], default_point[1]), (default_point[0], default_point[1]))
+	
+	bb = np.array([p.bounding_box() for p in polygons]).reshape(-1, 4)
+	
+	return ((float(bb[:, 0].min()), float(bb[:, 1].min())), (float(bb[:, 2].max()), float(bb[:, 3].max())))
+
+# GDS graphics, shared by all designs in the process. Maps (file path, layer,
+# datatype) to the file's modification time, the polygons read from the top
+# level cell and their bounding box. Hits and misses are counted for checking
+# the cache during sweeps.
+graphic_cache = {}
+graphic_cache_stats = {"hits": 0, "misses": 0}
+
+def read_graphic(gds_filename:str, read_layer:int=1, read_datatype:int=0):
+	''' Returns the polygons on (read_layer, read_datatype) in the top level cell of
+	a GDS file, and their bounding box (see polygons_bounding_box()). Each file
+	is read once and cached, and read again if it has changed on disk. The
+	polygons are shared, so copy them before modifying. Raises an exception if
+	the file cannot be read. '''
+	
+	file_path = os.path.abspath(gds_filename)
+	mtime = os.stat(file_path).st_mtime_ns
+	key = (file_path, read_layer, read_datatype)
+	
+	if key in graphic_cache and graphic_cache[key][0] == mtime:
+		graphic_cache_stats["hits"] += 1
+	else:
+		graphic_cache_stats["misses"] += 1
+		lib_in = gdstk.read_gds(file_path, filter={(read_layer, read_datatype)})
+		polys = lib_in.top_level()[0].polygons
+		graphic_cache[key] = (mtime, polys, polygons_bounding_box(polys))
+	
+	debug(f"Graphic cache >{graphic_cache_stats['hits']}< hits, >{graphic_cache_stats['misses']}< misses.")
+	
+	return graphic_cache[key][1], graphic_cache[key][2]
+
+# Arc templates, shared by all designs in the process. Maps (shape, radius,
+# num_points) to a read-only Nx2 array of points.
+ARC_SHAPES = {"QUARTER_1": (0, PI/2), "QUARTER_3": (PI, 3*PI/2), "UPPER_HALF": (0, PI), "LOWER_HALF": (PI, 2*PI)}
+arc_template_cache = {}
+
+def arc_template(shape:str, radius_um:float, num_points:int):
+	''' Returns num_points evenly spaced points on a circular arc centered on the
+	origin, as an Nx2 array. shape is a key of ARC_SHAPES giving the start and
+	end angles of the arc. The points are calculated once and cached, so the
+	returned array is read-only; place it with a scale and offset, which
+	returns a new array. '''
+	
+	key = (shape, radius_um, num_points)
+	if key not in arc_template_cache:
+		theta = np.linspace(ARC_SHAPES[shape][0], ARC_SHAPES[shape][1], num_points)
+		points = np.column_stack((radius_um*np.cos(theta), radius_um*np.sin(theta)))
+		points.setflags(write=False)
+		arc_template_cache[key] = points
+	
+	return arc_template_cache[key]
+
+def straight_run(start:float, step:float, stop:float):
+	''' Returns the coordinates visited when stepping from start towards stop in
+	increments of step, stopping before the step that would reach or pass stop.
+	start itself is not included. The steps are accumulated in order, so the
+	values match those from repeatedly adding step. '''
+	
+	num_max = max(int((stop-start)/step) + 2, 1)
+	values = np.cumsum(np.concatenate(([start], np.full(num_max, step))))
+	num_steps = int(np.argmax((values + step - stop)*np.sign(step) >= 0))
+	
+	return values[1:num_steps+1]
+
+def arc_num_points(radius_um:float, angle:float, max_chord_error_um:float):
+	''' Returns the number of points needed to sample an arc of the given radius
+	and angle (radians) such that no chord deviates from the arc by more than
+	max_chord_error_um. '''
+	
+	step = 2*np.arccos(max(1 - max_chord_error_um/radius_um, 0))
+	step = min(step, PI/4)
+	
+	return int(np.ceil(abs(angle)/step)) + 1
+
+def spiral_extrema(theta_start:float, theta_end:float, spiral_b:float, r0:float, phase:float=0):
+	''' Returns the polar angles in the open interval (theta_start, theta_end) at
+	which the Archimedean spiral R = (theta-theta_start)*spiral_b + r0 has a
+	vertical (phase=0) or horizontal (phase=PI/2) tangent. These are the
+	solutions of theta = k*PI + phase + atan(spiral_b/R). '''
+	
+	k = np.arange(np.floor((theta_start-phase)/PI)-1, np.ceil((theta_end-phase)/PI)+1)
+	
+	# Fixed point iteration, converges quickly because spiral_b << R
+	theta_c = k*PI + phase
+	for i in range(5):
+		theta_c = k*PI + phase + np.arctan2(spiral_b, (theta_c-theta_start)*spiral_b + r0)
+	
+	return theta_c[(theta_c > theta_start) & (theta_c < theta_end)]
+
+def arc_polyline_length(radius_um:float, angle:float, num_points:int):
+	''' Returns the length of the polyline through num_points evenly spaced
+	points on an arc of the given radius and angle (radians). '''
+	
+	if num_points < 2:
+		return 0
+	
+	return (num_points-1)*2*radius_um*np.sin(abs(angle)/(2*(num_points-1)))
+
+def spiral_theta(theta_start:float, theta_end:float, spiral_b:float, r0:float, max_chord_error_um:float):
+	''' Samples the polar angle of the Archimedean spiral R = (theta-theta_start)*spiral_b + r0
+	such that no chord deviates from the spiral by more than max_chord_error_um.
+	
+	Each step is set from the local curvature k: a chord of length sqrt(8*e/k)
+	deviates from the curve by e, so the step in theta is sqrt(8*e/k)/|ds/dtheta|.
+	The tight inner turns therefore receive more points than the outer turns. The
+	points where the tangent is exactly vertical or horizontal are always
+	included, so that stretched runs join the spiral without a kink.
+	'''
+	
+	# Fine grid used to integrate the required point density
+	num_fine = int(np.ceil((theta_end-theta_start)/(2*PI)*64)) + 2
+	theta_f = np.linspace(theta_start, theta_end, num_fine)
+	R = (theta_f-theta_start)*spiral_b + r0
+	
+	# Curvature and arc length per radian for an Archimedean spiral
+	curvature = (R**2 + 2*spiral_b**2)/(R**2 + spiral_b**2)**1.5
+	ds_dtheta = np.sqrt(R**2 + spiral_b**2)
+	
+	# Largest step in theta, limiting the tangent to turn at most PI/4 per step
+	dtheta = np.sqrt(8*max_chord_error_um/curvature)/ds_dtheta
+	dtheta = np.minimum(dtheta, PI/4/(curvature*ds_dtheta))
+	
+	# Integrate number of points vs theta and sample at uniform point count. The
+	# larger density at either end of each interval is used, so steps never
+	# exceed dtheta.
+	density = 1/dtheta
+	count = np.concatenate(([0], np.cumsum(np.maximum(density[1:], density[:-1])*np.diff(theta_f))))
+	num_pts = int(np.ceil(count[-1])) + 1
+	theta = np.interp(np.linspace(0, count[-1], num_pts), count, theta_f)
+	
+	# Always include points where tangent is vertical or horizontal
+	theta_c = np.concatenate((spiral_extrema(theta_start, theta_end, spiral_b, r0, 0), spiral_extrema(theta_start, theta_end, spiral_b, r0, PI/2)))
+	
+	return np.unique(np.concatenate((theta, theta_c)))
+
+def first_reversal(x, direction:int):
+	''' Returns the index of the first point of x which does not continue moving
+	in direction (1 for increasing, -1 for decreasing) from the point before it,
+	or None if x is monotonic. '''
+	
+	stops = np.diff(x)*direction <= 0
+	if not stops.any():
+		return None
+	
+	return int(np.argmax(stops)) + 1
+
+def carry_sign(delta, skip, initial:float):
+	''' Returns the sign of each element of delta, where elements flagged in
+	skip repeat the previous sign. The returned array is one element longer
+	than delta and begins with initial, so element j is the direction of
+	travel arriving at point j. '''
+	
+	signs = np.concatenate(([initial], np.sign(delta)))
+	valid = np.concatenate(([True], np.logical_not(skip)))
+	
+	# Forward fill skipped elements with the last valid sign
+	fill_idx = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), 0))
+	return signs[fill_idx]
+
+def stretch_path(path_list, stretch_um:float, axis:int, signs, markers:list, force_marker:int=None, halve_markers:tuple=None):
+	''' Stretches a spiral path by inserting a straight run of length stretch_um
+	along axis (0 = x, 1 = y) everywhere the direction in signs changes. The
+	direction of each run follows the direction of travel along axis leading
+	into the change.
+	
+	Every change is found up front and the offsets are applied as a single
+	cumulative shift, so the pass is linear in the number of points.
+	
+	markers is a list of indices into path_list which are updated in place as
+	points are inserted. If force_marker is given, a change is always inserted
+	at markers[force_marker]. If halve_markers is given, runs falling strictly
+	between markers[halve_markers[0]] and markers[halve_markers[1]] are half
+	length.
+	
+	Returns the stretched path, or None if a direction could not be found.
+	'''
+	
+	n = len(path_list)
+	vals = path_list[:, axis]
+	
+	# Find all points where the direction changes
+	events = (np.flatnonzero(signs[1:] != signs[:-1]) + 1).tolist()
+	forced_idx = None
+	if force_marker is not None and 1 <= markers[force_marker] < n:
+		forced_idx = markers[force_marker]
+		if forced_idx not in events:
+			events = sorted(events + [forced_idx])
+	
+	inserted_at = [] # Index in path_list of each point a run was inserted before
+	dup_pos = [] # Position of each inserted point in the stretched path
+	cum_shift = [0] # Running total of shifts
+	
+	def current_value(pos:int, num_pts:int):
+		''' Value along axis of the stretched path at position pos, given only
+		the runs inserted so far. '''
+		
+		if pos < 0:
+			pos += num_pts
+		
+		# Points past the newest run have received every shift
+		if pos > dup_pos[-1]:
+			return vals[pos - len(dup_pos)] + cum_shift[-1]
+		
+		# Check for an inserted point, otherwise map back to path_list
+		b = bisect.bisect_left(dup_pos, pos)
+		if dup_pos[b] == pos:
+			return vals[inserted_at[b]-1] + cum_shift[b+1]
+		i = pos - b
+		return vals[i] + cum_shift[bisect.bisect_right(inserted_at, i)]
+	
+	for j in events:
+		
+		# Position of point j once all earlier runs are inserted
+		p = j + len(inserted_at)
+		
+		# A forced change only occurs if its marker still points at this point
+		if j == forced_idx and signs[j] == signs[j-1] and p != markers[force_marker]:
+			continue
+		
+		# Duplicate last point
+		dup_pos.append(p)
+		inserted_at.append(j)
+		cum_shift.append(cum_shift[-1])
+		
+		# Get sign of change along axis leading into the new run
+		ref_val = vals[j-1] + cum_shift[-1]
+		d = 0
+		sign_incr = 1
+		while abs(d) < 0.1:
+			sign_incr += 1
+			d = ref_val - current_value(p-sign_incr, n+len(inserted_at))
+			if sign_incr >= 10:
+				error("Failed to identify change in direction while extending spiral.")
+				return None
+		sign_val = d/abs(d)
+		
+		# For center reversals, divide delta evenly
+		if halve_markers is not None and p > markers[halve_markers[0]] and p < markers[halve_markers[1]]:
+			sign_val /= 2
+		
+		cum_shift[-1] += stretch_um * sign_val
+		
+		# Update markers to account for added point
+		for mi in range(len(markers)):
+			if p+1 < markers[mi]:
+				markers[mi] += 1
+	
+	if len(inserted_at) == 0:
+		return path_list.copy()
+	
+	# Insert duplicated points, then shift every point by the total of all
+	# runs inserted at or before it.
+	inserted_at = np.array(inserted_at)
+	shift = np.zeros(n)
+	shift[inserted_at] = np.diff(cum_shift)
+	shift = np.cumsum(shift)
+	
+	new_path = np.insert(path_list, inserted_at, path_list[inserted_at-1], axis=0)
+	new_path[:, axis] += np.insert(shift, inserted_at, shift[inserted_at])
+	
+	return new_path
+
+def segment_steps(path_list, spacing_um:float, length_um:float, perturbation_um:float):
+	''' Splits a path into alternating high impedance (ZH) and low impedance (ZL)
+	sections. The path begins with a ZH section of length spacing_um, followed by
+	a ZL section of length length_um, and so on, measured along the path.
+	
+	Each boundary is added as two points: one on the boundary, and one
+	perturbation_um before it along the same segment. The width changes between
+	these two points. A boundary closer than perturbation_um to the start of its
+	segment is moved up to that distance, and the start point takes the place of
+	the perturbed point.
+	
+	Returns the new Nx2 array of points, a boolean array which is True for points
+	on a ZL section, and the number of ZL sections started.
+	'''
+	
+	# Cumulative distance along path at each point
+	seg = np.diff(path_list, axis=0)
+	seg_len = np.hypot(seg[:, 0], seg[:, 1])
+	cum_len = np.concatenate(([0], np.cumsum(seg_len)))
+	
+	# Distance of every step boundary. Even boundaries start a ZL section.
+	period = spacing_um + length_um
+	num_periods = int(cum_len[-1]//period) + 1
+	bounds = np.empty(2*num_periods)
+	bounds[0::2] = np.arange(num_periods)*period + spacing_um
+	bounds[1::2] = np.arange(1, num_periods+1)*period
+	bounds = bounds[bounds <= cum_len[-1]]
+	
+	# Interpolate boundary points on the segment which contains them. Boundaries
+	# closer than perturbation_um to the segment start are moved up to that
+	# distance, so no point lands within the perturbation of a vertex.
+	seg_idx = np.searchsorted(cum_len, bounds, side='left') - 1
+	dist = np.clip(bounds - cum_len[seg_idx], perturbation_um, seg_len[seg_idx])
+	unit = seg[seg_idx]/seg_len[seg_idx, None]
+	pts_bound = path_list[seg_idx] + dist[:, None]*unit
+	pts_pert = pts_bound - unit*perturbation_um
+	
+	# Point is on a ZL section if an odd number of boundaries precede it
+	on_step = np.searchsorted(bounds, cum_len, side='right') % 2 == 1
+	bound_on_step = np.arange(len(bounds)) % 2 == 0
+	
+	# Insert perturbed point then boundary point ahead of the segment's end point.
+	# Perturbed points which would land on the segment start are dropped.
+	insert_at = np.repeat(seg_idx+1, 2)
+	new_points = np.column_stack((pts_pert, pts_bound)).reshape(-1, 2)
+	new_on_step = np.column_stack((np.logical_not(bound_on_step), bound_on_step)).reshape(-1)
+	keep = np.repeat(dist > perturbation_um, 2)
+	keep[1::2] = True
+	
+	points = np.insert(path_list, insert_at[keep], new_points[keep], axis=0)
+	on_step = np.insert(on_step, insert_at[keep], new_on_step[keep])
+	
+	return points, on_step, int(np.count_nonzero(bound_on_step))
+
+def strip_polygon(points, widths, layer:int=0, datatype:int=0):
+	''' Returns a gdstk Polygon covering a line of varying width, equivalent to a
+	FlexPath with natural joins and flush ends. The width is linearly tapered
+	between points.
+	
+	Points which double back on the previous segment are dropped.
+	'''
+	
+	points = np.asarray(points, dtype=float)
+	widths = np.asarray(widths, dtype=float)
+	
+	# Remove repeated points
+	seg = np.diff(points, axis=0)
+	keep = np.concatenate(([True], np.hypot(seg[:, 0], seg[:, 1]) > 1e-6))
+	points = points[keep]
+	widths = widths[keep]
+	
+	# Remove the end point of any segment which runs backwards relative to the
+	# segments on either side of it
+	seg = np.diff(points, axis=0)
+	reverses = np.sum(seg[1:]*seg[:-1], axis=1) < 0
+	backwards = np.logical_and(reverses[:-1], reverses[1:])
+	keep = np.concatenate(([True, True], np.logical_not(backwards), [True]))
+	points = points[keep]
+	widths = widths[keep]
+	
+	# Unit normal of each segment
+	seg = np.diff(points, axis=0)
+	seg /= np.hypot(seg[:, 0], seg[:, 1])[:, None]
+	normal = np.column_stack((-seg[:, 1], seg[:, 0]))
+	
+	# Offset direction at each point. At joins, this is the miter direction,
+	# scaled so each edge stays half the width from the center line.
+	n_in = np.concatenate(([normal[0]], normal))
+	n_out = np.concatenate((normal, [normal[-1]]))
+	miter = (n_in + n_out)/(1 + np.sum(n_in*n_out, axis=1))[:, None]
+	
+	offset = miter*widths[:, None]/2
+	outline = np.concatenate((points + offset, (points - offset)[::-1]))
+	
+	# gdstk reads complex points much faster than pairs
+	return gdstk.Polygon(outline.view(complex).ravel(), layer=layer, datatype=datatype)
+
+def clip_to_box(polygons:list, box_bl, box_tr, layer:int=0, datatype:int=0):
+	''' Returns the parts of polygons inside the axis-aligned box from box_bl to
+	box_tr, on the given layer and datatype. Polygons which lie wholly inside or
+	outside the box, and axis-aligned rectangles, are clipped arithmetically.
+	Only the remaining polygons go through gdstk.boolean. '''
+	
+	clipped = []
+	needs_boolean = []
+	for poly in polygons:
+		
+		(x0, y0), (x1, y1) = poly.bounding_box()
+		
+		# Wholly outside box (touching edges gives no area)
+		if x0 >= box_tr[0] or x1 <= box_bl[0] or y0 >= box_tr[1] or y1 <= box_bl[1]:
+			continue
+		
+		# Wholly inside box
+		if x0 >= box_bl[0] and x1 <= box_tr[0] and y0 >= box_bl[1] and y1 <= box_tr[1]:
+			clipped.append(gdstk.Polygon(poly.points, layer=layer, datatype=datatype))
+			continue
+		
+		# Axis-aligned rectangle, so the result is the overlap of the two boxes
+		if len(poly.points) == 4 and abs(poly.area() - (x1-x0)*(y1-y0)) <= 1e-9*(x1-x0)*(y1-y0):
+			clipped.append(gdstk.rectangle((max(x0, box_bl[0]), max(y0, box_bl[1])), (min(x1, box_tr[0]), min(y1, box_tr[1])), layer=layer, datatype=datatype))
+			continue
+		
+		needs_boolean.append(poly)
+	
+	if len(needs_boolean) > 0:
+		clipped += gdstk.boolean(needs_boolean, gdstk.rectangle(box_bl, box_tr), "and", layer=layer, datatype=datatype)
+	
+	return clipped
+
+def shared_cell_name(prefix:str, key:tuple):
+	''' Returns the name of a shared cell cached under key. The name is made from
+	a hash of the key, so it is the same in every process and library, and only
+	cells with the same contents share a name. '''
+	
+	return f"{prefix}_{hashlib.sha1(repr(key).encode()).hexdigest()[:12].upper()}"
+
+# Bond pad cells, shared by all designs in the process. Maps the pad parameters
+# to the pad cell and its ground plane cutout.
+pad_cell_cache = {}
+
+def pad_cell(io:dict, layers:dict, include_aSi:bool=True):
+	''' Returns a gdstk Cell containing a bond pad with its faux CPW taper, Al pad
+	and (if include_aSi) aSi opening, built from the io['pads'],
+	io['faux_cpw_taper'] and io['aSi_etch'] rules. Also returns the polygons to
+	cut from the ground plane around the pad. The pad is centered on x = 0 with
+	the chip edge along y = 0, and the taper runs towards +y.
+	
+	Each distinct set of parameters is built once and cached, so every design
+	can place the same cell with a Reference. '''
+	
+	pads = io['pads']
+	cpw = io['faux_cpw_taper']
+	key = (pads['width_um'], pads['height_um'], pads['gnd_gap_um'], pads['chip_edge_buffer_um'], pads['pad_exposed_height_um'], tuple(cpw['cpw_widths_um']), tuple(cpw['cpw_gaps_um']), tuple(cpw['cpw_section_lengths_um']), io['aSi_etch']['x_buffer_um'], io['aSi_etch']['extend_towards_edge_um'], include_aSi, layers['NbTiN'], layers['Aluminum'], layers['aSi'])
+	
+	if key not in pad_cell_cache:
+		
+		cell = gdstk.Cell(shared_cell_name("BOND_PAD", key))
+		pad_bottom = pads['chip_edge_buffer_um']
+		pad_top = pads['chip_edge_buffer_um'] + pads['height_um']
+		
+		# Create bond pad, then add each section of CPW taper
+		pad_line = gdstk.FlexPath((0, pad_bottom), pads['width_um'], layer=layers["NbTiN"])
+		pad_line.segment((0, pad_top), pads['width_um'])
+		gnd_line = gdstk.FlexPath((0, -10), pads['width_um']+pads['gnd_gap_um']*2)
+		gnd_line.segment((0, pad_top), pads['width_um']+pads['gnd_gap_um']*2)
+		
+		last_height = pad_top
+		for seg_w, seg_g, seg_l in zip(cpw['cpw_widths_um'], cpw['cpw_gaps_um'], cpw['cpw_section_lengths_um']):
+			last_height += seg_l
+			pad_line.segment((0, last_height), seg_w)
+			gnd_line.segment((0, last_height), seg_w+seg_g*2)
+		
+		cell.add(pad_line)
+		
+		# Add Al pad
+		cell.add(gdstk.rectangle((-pads['width_um']/2, pad_bottom), (pads['width_um']/2, pad_top), layer=layers['Aluminum']))
+		
+		# Add aSi opening, trimmed to the edge of the chip
+		if include_aSi:
+			aSi_half_width = pads['width_um']/2 + io['aSi_etch']['x_buffer_um']
+			cell.add(gdstk.rectangle((-aSi_half_width, max(pad_bottom - io['aSi_etch']['extend_towards_edge_um'], 0)), (aSi_half_width, pad_bottom + pads['pad_exposed_height_um']), layer=layers['aSi']))
+		
+		pad_cell_cache[key] = (cell, gnd_line.to_polygons())
+	
+	return pad_cell_cache[key]
+
+# Fiducial cells, shared by all designs in the process. Map the fiducial
+# parameters to the cell and its ground plane cutout.
+fiducial_cell_cache = {}
+fiducial_set_cache = {}
+
+def fiducial_cell(length_um:float, width_um:float, layer:int):
+	''' Returns a gdstk Cell containing one L_CORNER fiducial, and the fiducial
+	as a single polygon for cutting from the ground plane. The corner of the L
+	is at the origin, with its arms along +x and +y. Cached by parameters. '''
+	
+	key = (length_um, width_um, layer)
+	
+	if key not in fiducial_cell_cache:
+		
+		cell = gdstk.Cell(shared_cell_name("FIDUCIAL_L", key))
+		arms = [gdstk.rectangle((0, 0), (width_um, length_um), layer=layer), gdstk.rectangle((0, 0), (length_um, width_um), layer=layer)]
+		cell.add(*arms)
+		
+		fiducial_cell_cache[key] = (cell, gdstk.boolean(arms[0], arms[1], "or", layer=layer))
+	
+	return fiducial_cell_cache[key]
+
+def fiducial_set_cell(reticle_fiducial:dict, chip_size_um:list, layers:dict):
+	''' Returns a gdstk Cell holding the L_CORNER fiducials at each corner of a
+	chip listed in reticle_fiducial['corners'], and the combined ground plane
+	cutout. Corners are numbered counterclockwise from the top left. The cell is
+	centered on the chip, and cached by chip size and fiducial parameters. '''
+	
+	x_right = chip_size_um[0]//2
+	y_up = chip_size_um[1]//2
+	corners = tuple(sorted(set(reticle_fiducial['corners'])))
+	key = (reticle_fiducial['length_um'], reticle_fiducial['width_um'], layers['NbTiN'], x_right, y_up, corners)
+	
+	if key not in fiducial_set_cache:
+		
+		l_cell, l_cutout = fiducial_cell(reticle_fiducial['length_um'], reticle_fiducial['width_um'], layers['NbTiN'])
+		
+		# Position and rotation of L for each corner
+		placements = {1: ((-x_right, y_up), 3*np.pi/2), 2: ((-x_right, -y_up), 0), 3: ((x_right, -y_up), np.pi/2), 4: ((x_right, y_up), np.pi)}
+		
+		cell = gdstk.Cell(shared_cell_name("FIDUCIALS", key))
+		cutout = []
+		for c in corners:
+			origin, rotation = placements[c]
+			cell.add(gdstk.Reference(l_cell, origin, rotation))
+			for lc in l_cutout:
+				cutout.append(lc.copy().rotate(rotation).translate(origin[0], origin[1]))
+		
+		fiducial_set_cache[key] = (cell, cutout)
+	
+	return fiducial_set_cache[key]
+
+def add_dependencies(lib, cell):
+	''' Adds every cell referenced (directly or indirectly) by cell to lib, if it
+	is not already there. '''
+	
+	names = [c.name for c in lib.cells]
+	for dep in cell.dependencies(True):
+		if dep.name not in names:
+			lib.add(dep)
+			names.append(dep.name)
+
+# Taper profiles understood by taper_profile(). Phi for the Klopfenstein profile
+# is tabulated on this many points between x=0 and x=1.
+TAPER_TYPES = ("NONE", "LINEAR", "EXPONENTIAL", "RAISED_COSINE", "KLOPFENSTEIN")
+KLOPFENSTEIN_NUM_POINTS = 2001
+
+def klopfenstein_phi(A:float, num_points:int=KLOPFENSTEIN_NUM_POINTS, num_terms:int=40):
+	''' Returns the Klopfenstein taper function phi(x, A), the integral from 0 to x
+	of I1(A*sqrt(1-y^2))/(A*sqrt(1-y^2)) dy, tabulated on num_points evenly spaced
+	values of x between 0 and 1. phi is odd in x. I1(u)/u is summed from its power
+	series, and the integral is taken with the trapezoid rule. '''
+	
+	x = np.linspace(0, 1, num_points)
+	u2_4 = A**2*(1 - x**2)/4
+	
+	term = np.full(num_points, 0.5)
+	integrand = term.copy()
+	for k in range(1, num_terms):
+		term = term*u2_4/(k*(k+1))
+		integrand += term
+	
+	phi = np.concatenate(([0], np.cumsum((integrand[1:] + integrand[:-1])/2*np.diff(x))))
+	
+	return x, phi
+
+def taper_profile(ttype:str, start_width_um:float, end_width_um:float, length_um:float, max_ripple:float=0.05):
+	''' Precalculates the parameters of a taper from start_width_um, at the bond
+	pad, to end_width_um over length_um. Returns a dict for use with
+	taper_widths(), or None if ttype is not one of TAPER_TYPES.
+	
+	Type options: (Case insensitive)
+		NONE: No taper, immediately jumps to the end width.
+		LINEAR: Width changes linearly.
+		EXPONENTIAL: Width changes exponentially, so the log of the width is linear.
+		RAISED_COSINE: Width follows half a cosine period, with zero slope at both ends.
+		KLOPFENSTEIN: The log of the width follows a Klopfenstein impedance taper
+			with passband reflection max_ripple. The width stands in for
+			impedance, so as with the real taper there is a small jump at each end.
+	'''
+	
+	ttype = ttype.upper()
+	if ttype not in TAPER_TYPES:
+		return None
+	
+	if length_um <= 0:
+		ttype = "NONE"
+	
+	profile = {"type": ttype, "start_width_um": start_width_um, "end_width_um": end_width_um, "length_um": length_um}
+	
+	if ttype == "KLOPFENSTEIN":
+		
+		# Reflection of an abrupt step, and the taper parameter A giving max_ripple
+		gamma_0 = np.log(end_width_um/start_width_um)/2
+		A = np.arccosh(max(abs(gamma_0)/max_ripple, 1))
+		
+		profile['phi_x'], phi = klopfenstein_phi(A)
+		profile['log_mean_width'] = np.log(start_width_um*end_width_um)/2
+		profile['phi_scale'] = gamma_0*A**2/np.cosh(A)
+		profile['phi'] = phi
+	
+	return profile
+
+def taper_widths(profile:dict, z):
+	''' Returns the width of the taper described by profile (from taper_profile())
+	at distance z from the bond pad. z can be a single distance or an array of
+	distances. Beyond the end of the taper the width is the end width. '''
+	
+	z = np.asarray(z, dtype=float)
+	w0 = profile['start_width_um']
+	w1 = profile['end_width_um']
+	
+	if profile['type'] == "NONE":
+		return np.full_like(z, w1)[()]
+	
+	t = np.clip(z/profile['length_um'], 0, 1)
+	
+	if profile['type'] == "LINEAR":
+		widths = w0 + (w1 - w0)*t
+	elif profile['type'] == "EXPONENTIAL":
+		widths = w0*(w1/w0)**t
+	elif profile['type'] == "RAISED_COSINE":
+		widths = w1 + (w0 - w1)*(1 + np.cos(PI*t))/2
+	elif profile['type'] == "KLOPFENSTEIN":
+		x = 2*t - 1
+		phi = np.sign(x)*np.interp(np.abs(x), profile['phi_x'], profile['phi'])
+		widths = np.exp(profile['log_mean_width'] + profile['phi_scale']*phi)
+	
+	return np.where(z >= profile['length_um'], w1, widths)[()]
+
 class MultiChipDesign:
 	
 	def __init__(self, num_designs:int):
@@ -303,6 +1088,7 @@ class MultiChipDesign:
 		if DUMMY_MODE:
 			info(f"Skipping write GDS file >DUMMY_MODE<=>TRUE<.")
 		else:
+			add_dependencies(self.lib, self.main_cell)
 			self.lib.write_gds(filename)
 			info(f"Wrote GDS file {MPrC}'{filename}'{StdC}")
 
@@ -333,6 +1119,8 @@ class ChipDesign:
 		self.gnd_pad_buffer_y_um = 110
 		
 		self.graphics_on_gnd = None
+		self.use_shared_cells = False # If true, bond pads and fiducials are placed as references to cells shared by all designs
+		self.use_text_cells = False # If true, each distinct line of text is placed as a reference to a cell shared by all designs
 		
 		self.lib = gdstk.Library()
 		self.main_cell = self.lib.new_cell("MAIN")
@@ -348,6 +1136,9 @@ class ChipDesign:
 		self.text_obj_list = []
 		self.fiducials = []
 		self.temp_pads = [] # Stores bond pad dimensions. Not added to gdstk cell, but used to calculate aSi and gnd shapes.
+		self.gnd_cutouts = [] # Shapes to subtract from the ground plane. Applied together by resolve_gnd_cutouts().
+		self.cell_refs = [] # References to shared bond pad, fiducial and text cells, used if use_shared_cells or use_text_cells is true.
+		self.text_cell_cutouts = [] # Padded boxes of engraved text cells with their references. Checked by resolve_gnd_cutouts().
 		
 		# Updated parameters
 		self.corner_bl = (-1, -1)
@@ -355,15 +1146,25 @@ class ChipDesign:
 		self.pad_height = -1
 		
 		self.surpress_warning_ttype = False 
+		self.taper_cache = None # (settings, profile) from get_taper_profile()
 		
 		self.use_steps = False
+		self.step_emitter = "FLEXPATH"
+		self.taper_into_steps = False
 		self.step_width_um = None
 		self.step_length_um = None
 		self.step_spacing_um = None
 		
-	def configure_steps(self, ZL_width_um:float, ZH_width_um:float, ZL_length_um:float, ZH_length_um:float):
+	def configure_steps(self, ZL_width_um:float, ZH_width_um:float, ZL_length_um:float, ZH_length_um:float, emitter:str="FLEXPATH", taper_into_steps:bool=False):
+		''' Enables stepped impedance sections on the spiral. The emitter selects how
+		the stepped line is written, either as a FlexPath ("FLEXPATH") or directly
+		as a single polygon ("POLYGON"). If taper_into_steps is true, the IO taper
+		of a through line continues into its steps rather than ending at the bond
+		pad. '''
 		
 		self.use_steps = True
+		self.step_emitter = emitter
+		self.taper_into_steps = taper_into_steps
 		self.step_width_um = ZL_width_um
 		self.ZH_step_width_um = ZH_width_um
 		self.step_length_um = ZL_length_um
@@ -448,6 +1249,19 @@ class ChipDesign:
 		# Add text objects
 		for to in self.text_obj_list:
 			to.rotate(arg, center_point)
+		
+		# Add queued ground plane cutouts
+		for gc in self.gnd_cutouts:
+			gc.rotate(arg, center_point)
+		for tc, ref in self.text_cell_cutouts:
+			tc.rotate(arg, center_point)
+		
+		# Add references to shared cells
+		for pr in self.cell_refs:
+			dx = pr.origin[0] - center_point[0]
+			dy = pr.origin[1] - center_point[1]
+			pr.origin = (center_point[0] + dx*np.cos(arg) - dy*np.sin(arg), center_point[1] + dx*np.sin(arg) + dy*np.cos(arg))
+			pr.rotation += arg
 	
 	def translate(self, move_x:float, move_y:float):
 		''' Translate the chip design by the value arg, in microns. '''
@@ -477,6 +1291,16 @@ class ChipDesign:
 		# Add text objects
 		for to in self.text_obj_list:
 			to.translate(move_x, move_y)
+		
+		# Add queued ground plane cutouts
+		for gc in self.gnd_cutouts:
+			gc.translate(move_x, move_y)
+		for tc, ref in self.text_cell_cutouts:
+			tc.translate(move_x, move_y)
+		
+		# Add references to shared cells
+		for pr in self.cell_refs:
+			pr.origin = (pr.origin[0] + move_x, pr.origin[1] + move_y)
 	
 	def apply_objects(self, target_cell=None):
 		''' Saves all objects to the cell '''
@@ -484,6 +1308,9 @@ class ChipDesign:
 		if target_cell is None:
 			target_cell = self.main_cell
 		
+		# Engrave any queued text and graphics into ground plane
+		self.resolve_gnd_cutouts()
+		
 		# # This should be moved to build I think
 		# if self.NbTiN_is_etch:
 		# 	info(f"Inverting layers to calculate etch pattern.")
@@ -554,6 +1381,431 @@ class ChipDesign:
 		# Add text objects
 		for to in self.text_obj_list:
 			target_cell.add(to)
+		
+		# Add references to shared cells
+		for pr in self.cell_refs:
+			target_cell.add(pr)
+	
+	def calc_y_fit(self, y_min:float, y_max:float):
+		''' Calculates where the spiral is placed vertically on the chip, given the
+		lowest and highest Y-coordinates of the unstretched spiral about its center.
+		
+		Returns a dictionary with the spiral height, the allowed height, the
+		selected Y-offset, the lower and upper margins, and whether the spiral fits.
+		'''
+		
+		dY = y_max - y_min
+		if self.io['same_side']:
+			upper_bound = self.chip_size_um[1]/2
+		else:
+			upper_bound = self.chip_size_um[1]/2 - self.io['outer']['y_line_offset_um'] - self.pad_height
+		lower_bound = -self.chip_size_um[1]/2 + self.io['inner']['y_line_offset_um'] + self.pad_height
+		
+		allowed_size = upper_bound - lower_bound - self.spiral_io_buffer_um - self.chip_edge_buffer_um
+		
+		fit = {}
+		fit['fits'] = (dY <= allowed_size)
+		fit['height_um'] = dY
+		fit['allowed_height_um'] = allowed_size
+		fit['y_offset_um'] = lower_bound + self.spiral_io_buffer_um + (allowed_size - dY)/2 + abs(y_min)
+		fit['lower_margin_um'] = self.spiral_io_buffer_um + (allowed_size - dY)/2
+		fit['upper_margin_um'] = self.chip_edge_buffer_um + (allowed_size - dY)/2
+		
+		return fit
+	
+	def calc_x_fit(self, x_min:float, x_max:float):
+		''' Checks whether the spiral fits horizontally on the chip, given the lowest
+		and highest X-coordinates of the unstretched spiral about its center. The
+		spiral is always centered on the chip, so the horizontal stretch is included.
+		The spiral fits if the widest section of line stays on the chip.
+		
+		Returns a dictionary with the stretched spiral width, the allowed width, the
+		left and right margins from the line center to the chip edges, and whether
+		the spiral fits.
+		'''
+		
+		# Stretched spiral is shifted left by half the stretch
+		x_left = x_min - self.spiral['horiz_stretch_um']//2
+		x_right = x_max - self.spiral['horiz_stretch_um']//2 + self.spiral['horiz_stretch_um']
+		
+		line_width = self.tlin['Wcenter_um']
+		if self.use_steps:
+			line_width = max(self.step_width_um, self.ZH_step_width_um)
+		
+		fit = {}
+		fit['width_um'] = x_right - x_left
+		fit['allowed_width_um'] = self.chip_size_um[0] - line_width
+		fit['left_margin_um'] = x_left + self.chip_size_um[0]/2
+		fit['right_margin_um'] = self.chip_size_um[0]/2 - x_right
+		fit['fits'] = (fit['left_margin_um'] >= line_width/2) and (fit['right_margin_um'] >= line_width/2)
+		
+		return fit
+	
+	def check_fit(self):
+		''' Checks whether the spiral fits on the chip, applying the same checks as
+		build() (calc_y_fit() and calc_x_fit()), without building the spiral. The
+		extremes of the spiral lie at its analytic vertical and horizontal tangents
+		or its ends, so only the samples next to these are evaluated. The bounding
+		box is therefore identical to that of the spiral sampled by build().
+		
+		Returns a dictionary with keys:
+			fits: True if build() accepts the spiral placement
+			width_um: Width of the stretched spiral
+			height_um: Height of the unstretched spiral, as checked by build()
+			allowed_width_um, allowed_height_um: Size of region available, excluding buffers
+			left_margin_um, right_margin_um: Distance from stretched spiral to chip edges
+			lower_margin_um, upper_margin_um: Distance from unstretched spiral to the IO
+				lines or chip edge, as checked by build()
+			stretched_height_um: Height of the spiral including the vertical stretch
+			stretched_lower_margin_um, stretched_upper_margin_um: Margins of the
+				stretched spiral. These are for information only, build() does not
+				check them.
+			y_offset_um: Y-offset selected for the spiral center
+		Returns None if the design has no spiral.
+		'''
+		
+		if self.spiral['num_rotations'] == 0:
+			return None
+		
+		spiral_num = self.spiral['num_rotations']//2
+		spiral_b = self.spiral['spacing_um']/PI
+		spiral_rot_offset = PI
+		r0 = self.reversal['diameter_um']
+		max_chord_error = self.spiral.get('max_chord_error_um', None)
+		
+		if self.io['same_side']:
+			spiral_num2 = spiral_num+0.5
+		else:
+			spiral_num2 = spiral_num
+		
+		theta_end1 = spiral_rot_offset+2*PI*spiral_num
+		theta_end2 = spiral_rot_offset+2*PI*spiral_num2
+		
+		# Number of evenly spaced points used by build() for each spiral
+		if max_chord_error is None:
+			num_pts1 = self.spiral["num_points"]//2
+			num_pts2 = round(self.spiral["num_points"]/2*(spiral_num+0.5)/spiral_num)
+		else:
+			num_pts1 = None
+			num_pts2 = None
+		
+		# Between tangents the coordinate is monotonic, so the extremes of the
+		# sampled spiral are at the samples either side of a tangent, or at the
+		# ends. Adaptive sampling includes the tangents themselves. Spiral 2 is
+		# spiral 1 rotated by 180 degrees.
+		def spiral_bounds(theta_end, num_pts, phase, trig, sign):
+			theta_c = spiral_extrema(spiral_rot_offset, theta_end, spiral_b, r0, phase)
+			if num_pts is None:
+				theta = np.concatenate(([spiral_rot_offset, theta_end], theta_c))
+			else:
+				theta_all = np.linspace(spiral_rot_offset, theta_end, num_pts)
+				idx = np.floor((theta_c-spiral_rot_offset)/(theta_end-spiral_rot_offset)*(num_pts-1)).astype(int)
+				idx = np.clip(np.concatenate(([0, num_pts-1], idx-1, idx, idx+1, idx+2)), 0, num_pts-1)
+				theta = theta_all[idx]
+			vals = sign*((theta-spiral_rot_offset)*spiral_b + r0)*trig(theta)
+			return vals.min(), vals.max()
+		
+		x_min1, x_max1 = spiral_bounds(theta_end1, num_pts1, 0, np.cos, 1)
+		x_min2, x_max2 = spiral_bounds(theta_end2, num_pts2, 0, np.cos, -1)
+		y_min1, y_max1 = spiral_bounds(theta_end1, num_pts1, PI/2, np.sin, 1)
+		y_min2, y_max2 = spiral_bounds(theta_end2, num_pts2, PI/2, np.sin, -1)
+		
+		x_fit = self.calc_x_fit(min(x_min1, x_min2), max(x_max1, x_max2))
+		y_fit = self.calc_y_fit(min(y_min1, y_min2), max(y_max1, y_max2))
+		
+		# Stretched spiral is shifted down by half the stretch
+		vert_stretch = self.spiral['vert_stretch_um']
+		
+		fit = {}
+		fit['fits'] = x_fit['fits'] and y_fit['fits']
+		fit['width_um'] = x_fit['width_um']
+		fit['height_um'] = y_fit['height_um']
+		fit['allowed_width_um'] = x_fit['allowed_width_um']
+		fit['allowed_height_um'] = y_fit['allowed_height_um']
+		fit['left_margin_um'] = x_fit['left_margin_um']
+		fit['right_margin_um'] = x_fit['right_margin_um']
+		fit['lower_margin_um'] = y_fit['lower_margin_um']
+		fit['upper_margin_um'] = y_fit['upper_margin_um']
+		fit['stretched_height_um'] = y_fit['height_um'] + vert_stretch
+		fit['stretched_lower_margin_um'] = y_fit['lower_margin_um'] - vert_stretch//2
+		fit['stretched_upper_margin_um'] = y_fit['upper_margin_um'] - (vert_stretch - vert_stretch//2)
+		fit['y_offset_um'] = y_fit['y_offset_um']
+		
+		return fit
+	
+	def calc_metrics(self):
+		''' Calculates the line length, number of low impedance steps and spiral fit
+		of the design without building any geometry. Only the spiral points are
+		sampled; stretching, IO lines and steps are calculated analytically, so
+		values match those reported by build() to within rounding error.
+		
+		Returns a dictionary with keys:
+			spiral_length_um: Length of the spiral, including reversal and tails
+			io_inner_length_um: Length of meandered line to inner spiral conductor
+			io_outer_length_um: Length of meandered line to outer spiral conductor
+			io_length_um: Sum of both meandered line lengths
+			total_line_length_um: Equivalent of total_line_length after build()
+			num_steps: Equivalent of total_number_steps after build()
+			fit: Output of calc_y_fit(), or None if there is no spiral
+		'''
+		
+		# Get offset parameters
+		baseline_offset = self.chip_size_um[1]//2 # Offset to translate (y = 0) to actual bottom of chip
+		just_offset = self.chip_size_um[0]//2 # Offset to translate (x = 0) to actual left side of chip
+		
+		metrics = {}
+		
+		if self.spiral['num_rotations'] == 0:
+			
+			# Both through lines run from the bond pad taper to the center of the chip
+			start_y = 0
+			
+			metrics['spiral_length_um'] = 0
+			metrics['fit'] = None
+			
+			if self.use_steps:
+				
+				# Steps are added until the line is within through_leads_um of the bond pad
+				period = self.step_length_um + self.step_spacing_um
+				
+				upper_run = (-self.pad_height+baseline_offset-self.through_leads_um) - start_y
+				lower_run = start_y - (self.pad_height-baseline_offset+self.through_leads_um)
+				num_upper = max(1, int(np.ceil((upper_run - self.step_spacing_um/2 - self.step_length_um)/period)) + 1)
+				num_lower = max(1, int(np.ceil((lower_run - self.step_spacing_um/2 - self.step_length_um)/period)) + 1)
+				
+				upper_length = (baseline_offset - self.pad_height) - start_y
+				lower_length = start_y - (self.pad_height - baseline_offset)
+				
+				metrics['num_steps'] = num_lower
+				if self.io['same_side']:
+					metrics['io_outer_length_um'] = lower_length
+					metrics['num_steps'] += num_lower
+				else:
+					metrics['io_outer_length_um'] = upper_length
+					metrics['num_steps'] += num_upper
+				metrics['io_inner_length_um'] = lower_length
+			else:
+				metrics['io_outer_length_um'] = abs(baseline_offset - self.pad_height - start_y)
+				metrics['io_inner_length_um'] = abs(baseline_offset - self.pad_height - start_y)
+				metrics['num_steps'] = 0
+			
+			metrics['io_length_um'] = metrics['io_inner_length_um'] + metrics['io_outer_length_um']
+			metrics['total_line_length_um'] = metrics['io_length_um']
+			
+			return metrics
+		
+		spiral_num = self.spiral['num_rotations']//2
+		spiral_b = self.spiral['spacing_um']/PI
+		spiral_rot_offset = PI
+		center_circ_diameter = self.reversal['diameter_um']
+		max_chord_error = self.spiral.get('max_chord_error_um', None)
+		
+		if self.io['same_side']:
+			spiral_num2 = spiral_num+0.5
+		else:
+			spiral_num2 = spiral_num
+		
+		theta_end1 = spiral_rot_offset+2*PI*spiral_num
+		theta_end2 = spiral_rot_offset+2*PI*spiral_num2
+		R_end1 = (theta_end1-spiral_rot_offset)*spiral_b + center_circ_diameter
+		R_end2 = (theta_end2-spiral_rot_offset)*spiral_b + center_circ_diameter
+		
+		# ---------------- Fit check
+		
+		# Sample spirals exactly as build() does. Spiral 2 is spiral 1 rotated by
+		# 180 degrees.
+		if max_chord_error is None:
+			theta1 = np.linspace(spiral_rot_offset, theta_end1, self.spiral["num_points"]//2)
+			theta2 = np.linspace(spiral_rot_offset, theta_end2, round(self.spiral["num_points"]/2*(spiral_num+0.5)/spiral_num))
+		else:
+			theta1 = spiral_theta(spiral_rot_offset, theta_end1, spiral_b, center_circ_diameter, max_chord_error)
+			theta2 = spiral_theta(spiral_rot_offset, theta_end2, spiral_b, center_circ_diameter, max_chord_error)
+		
+		R1 = (theta1-spiral_rot_offset)*spiral_b + center_circ_diameter
+		R2 = (theta2-spiral_rot_offset)*spiral_b + center_circ_diameter
+		X1 = R1*np.cos(theta1)
+		Y1 = R1*np.sin(theta1)
+		X2 = -1*R2*np.cos(theta2)
+		Y2 = -1*R2*np.sin(theta2)
+		
+		fit = self.calc_y_fit(min(Y1.min(), Y2.min()), max(Y1.max(), Y2.max()))
+		metrics['fit'] = fit
+		
+		# ---------------- Spiral length
+		
+		def polyline_length(X, Y):
+			return np.sum(np.hypot(np.diff(X), np.diff(Y)))
+		
+		if self.reversal['mode'].upper() == "CIRCLE_SMOOTH":
+			
+			# Spirals are trimmed at the first sample where the x-direction reverses,
+			# and a straight run joins the next sample to the reversal circle
+			def trimmed_arm(X, Y, direction):
+				idx = first_reversal(X, direction)
+				join = np.hypot(X[idx] - X[idx-1], Y[idx] - Y[0])
+				return polyline_length(X[idx:], Y[idx:]) + join, abs(X[idx-1])
+			
+			arm_length1, center_circ_diameter = trimmed_arm(X1, Y1, -1)
+			arm_length2, _ = trimmed_arm(X2, Y2, 1)
+			arm_length = arm_length1 + arm_length2
+		else:
+			arm_length = polyline_length(X1, Y1) + polyline_length(X2, Y2)
+		
+		if max_chord_error is None:
+			circ_num_pts = self.reversal['num_points']//2
+		else:
+			circ_num_pts = arc_num_points(center_circ_diameter/2, PI, max_chord_error)
+		reversal_length = 2*arc_polyline_length(center_circ_diameter/2, PI, circ_num_pts)
+		
+		# A vertical run is added at each vertical tangent, at the start of the spiral
+		# and at the center of the reversal. A horizontal run is added at each
+		# horizontal tangent, and split across the two reversal circles.
+		r0 = self.reversal['diameter_um']
+		num_vert = 2 + len(spiral_extrema(spiral_rot_offset, theta_end1, spiral_b, r0, 0)) + len(spiral_extrema(spiral_rot_offset, theta_end2, spiral_b, r0, 0))
+		num_horiz = 1 + len(spiral_extrema(spiral_rot_offset, theta_end1, spiral_b, r0, PI/2)) + len(spiral_extrema(spiral_rot_offset, theta_end2, spiral_b, r0, PI/2))
+		stretch_length = num_vert*self.spiral['vert_stretch_um'] + num_horiz*self.spiral['horiz_stretch_um']
+		
+		metrics['spiral_length_um'] = arm_length + reversal_length + stretch_length + 2*self.spiral['tail_length_um']
+		
+		# ---------------- IO lengths
+		
+		# Find ends of spiral. Runs inserted along the spiral cancel in pairs,
+		# except where the spiral ends on the same side it starts.
+		start_point = [-R_end1 - self.spiral['horiz_stretch_um']//2, fit['y_offset_um'] - self.spiral['tail_length_um'] - self.spiral['vert_stretch_um']//2]
+		if self.io['same_side']:
+			end_point = [-R_end2 - self.spiral['horiz_stretch_um']//2, fit['y_offset_um'] - self.spiral['tail_length_um'] - self.spiral['vert_stretch_um']//2 + self.spiral['vert_stretch_um']]
+		else:
+			end_point = [R_end2 - self.spiral['horiz_stretch_um']//2 + self.spiral['horiz_stretch_um'], fit['y_offset_um'] + self.spiral['tail_length_um'] - self.spiral['vert_stretch_um']//2]
+		
+		def io_length(start_point, location_rules:dict, use_alt_side:bool):
+			''' Length of meandered line from bond pad to start_point '''
+			
+			r = self.io['curve_radius_um']
+			x_pad = location_rules['x_pad_offset_um']-just_offset
+			bend_length = arc_polyline_length(r, PI/2, self.io['num_points_bend'])
+			
+			if not use_alt_side:
+				y_line = self.pad_height + location_rules['y_line_offset_um'] - baseline_offset
+				return (location_rules['y_line_offset_um'] - r) + abs(x_pad - start_point[0] - 2*r) + abs(start_point[1] - (y_line + r)) + 2*bend_length
+			else:
+				y_line = baseline_offset - self.pad_height - location_rules['y_line_offset_um']
+				return (location_rules['y_line_offset_um'] - r) + abs(start_point[0] - x_pad - 2*r) + abs((y_line - r) - start_point[1]) + 2*bend_length
+		
+		metrics['io_inner_length_um'] = io_length(start_point, self.io['inner'], False)
+		metrics['io_outer_length_um'] = io_length(end_point, self.io['outer'], not self.io['same_side'])
+		metrics['io_length_um'] = metrics['io_inner_length_um'] + metrics['io_outer_length_um']
+		metrics['total_line_length_um'] = metrics['spiral_length_um'] + metrics['io_length_um']
+		
+		# ---------------- Steps
+		
+		# Each low impedance section begins one step spacing after the last
+		metrics['num_steps'] = 0
+		if self.use_steps and metrics['spiral_length_um'] >= self.step_spacing_um:
+			period = self.step_length_um + self.step_spacing_um
+			metrics['num_steps'] = int((metrics['spiral_length_um'] - self.step_spacing_um)//period) + 1
+		
+		return metrics
+	
+	def solve_line_length(self, target_length_um:float, num_rotations:list=None, spacing_um:list=None, max_vert_stretch_um:float=None, tolerance_um:float=1, apply:bool=False):
+		''' Finds spiral parameters which give a total line length of target_length_um.
+		
+		Every combination of num_rotations and spacing_um is checked. For each, the
+		vertical stretch is solved for directly, and the candidate is kept if it
+		passes check_fit(), which applies the same fit checks as build(). All other
+		parameters are taken from the current design. Each candidate is evaluated
+		with calc_metrics() and check_fit(), so no geometry is built.
+		
+		Args:
+			target_length_um: Desired total_line_length.
+			num_rotations: Candidate numbers of rotations. Defaults to every even
+				number up to the largest spiral that fits.
+			spacing_um: Candidate spiral spacings. Defaults to the current spacing.
+			max_vert_stretch_um: Largest vertical stretch allowed. Defaults to no
+				limit beyond fitting on the chip.
+			tolerance_um: Maximum allowed error in line length.
+			apply: If true, the selected parameters are written to self.spiral.
+		
+		Returns a dictionary with the selected num_rotations, spacing_um and
+		vert_stretch_um, the resulting metrics, and the number of candidates
+		which met the target. If several candidates meet the target, the one whose
+		stretched spiral is furthest from the IO lines and chip edge is selected.
+		Returns None if no candidate meets the target.
+		'''
+		
+		if spacing_um is None:
+			spacing_um = [self.spiral['spacing_um']]
+		
+		original_spiral = self.spiral
+		solutions = []
+		
+		try:
+			for spacing in spacing_um:
+				
+				# Get default rotation candidates, stopping at the first that doesn't fit
+				if num_rotations is None:
+					rotation_list = []
+					nr = 2
+					while True:
+						self.spiral = dict(original_spiral, num_rotations=nr, spacing_um=spacing, vert_stretch_um=0)
+						if not self.check_fit()['fits']:
+							break
+						rotation_list.append(nr)
+						nr += 2
+				else:
+					rotation_list = num_rotations
+				
+				for nr in rotation_list:
+					
+					# Line length is linear in the vertical stretch, so solve directly
+					# and then correct once for rounding in the stretch offsets
+					self.spiral = dict(original_spiral, num_rotations=nr, spacing_um=spacing, vert_stretch_um=0)
+					m0 = self.calc_metrics()
+					if m0['fit'] is None:
+						continue
+					self.spiral['vert_stretch_um'] = 1000
+					m1 = self.calc_metrics()
+					slope = (m1['total_line_length_um'] - m0['total_line_length_um'])/1000
+					
+					vert_stretch = (target_length_um - m0['total_line_length_um'])/slope
+					if vert_stretch < 0 or (max_vert_stretch_um is not None and vert_stretch > max_vert_stretch_um):
+						continue
+					
+					self.spiral['vert_stretch_um'] = vert_stretch
+					m = self.calc_metrics()
+					vert_stretch += (target_length_um - m['total_line_length_um'])/slope
+					self.spiral['vert_stretch_um'] = vert_stretch
+					m = self.calc_metrics()
+					
+					# Check spiral fits
+					fit = self.check_fit()
+					if not fit['fits']:
+						continue
+					margin = min(fit['stretched_lower_margin_um'], fit['stretched_upper_margin_um'])
+					
+					err = m['total_line_length_um'] - target_length_um
+					if abs(err) > tolerance_um:
+						continue
+					
+					solutions.append({'num_rotations': nr, 'spacing_um': spacing, 'vert_stretch_um': vert_stretch, 'error_um': err, 'margin_um': margin, 'metrics': m})
+		finally:
+			self.spiral = original_spiral
+		
+		if len(solutions) == 0:
+			error(f"Failed to find spiral parameters for line length >{target_length_um} um<.")
+			return None
+		
+		# Pick solution with most room to spare
+		best = max(solutions, key=lambda x: x['margin_um'])
+		best['num_solutions'] = len(solutions)
+		
+		info(f"Selected >{best['num_rotations']}< rotations, spacing >{best['spacing_um']} um<, vertical stretch >{rd(best['vert_stretch_um'])} um< for line length >{rd(best['metrics']['total_line_length_um'])} um<.")
+		
+		if apply:
+			self.spiral['num_rotations'] = best['num_rotations']
+			self.spiral['spacing_um'] = best['spacing_um']
+			self.spiral['vert_stretch_um'] = best['vert_stretch_um']
+		
+		return best
 	
 	def build(self):
 		""" Creates the chip design from the specifications. """
@@ -622,7 +1874,11 @@ class ChipDesign:
 		# ---------------------------------------------------------------------
 		# Build IO structures (meandered lines and bond pads)
 		
-		if self.reticle_fiducial['type'].upper() == "L_CORNER":
+		if self.reticle_fiducial['type'].upper() == "L_CORNER" and self.use_shared_cells:
+			
+			self.place_fiducial_cells()
+		
+		elif self.reticle_fiducial['type'].upper() == "L_CORNER":
 			
 			# Define local coordinates
 			x_right = self.chip_size_um[0]//2
@@ -652,8 +1908,16 @@ class ChipDesign:
 		# ---------------------------------------------------------------------
 		# Add objects to chip design
 		
+		# Place bond pads from shared pad cells, or build each one directly
+		if self.use_shared_cells:
+			aSi_pads = self.place_pad_cells()
+			flat_pads = []
+		else:
+			aSi_pads = self.temp_pads
+			flat_pads = self.temp_pads
+		
 		# Add Al layer
-		for pad in self.temp_pads:
+		for pad in flat_pads:
 			
 			bl = pad[0]
 			tr = pad[1]
@@ -664,7 +1928,7 @@ class ChipDesign:
 		#TODO: Check file for if aSi is etch or releif
 		
 		# Add aSi etch layer
-		for pad in self.temp_pads:
+		for pad in aSi_pads:
 			
 			bl = pad[0]
 			tr = pad[1]
@@ -679,12 +1943,11 @@ class ChipDesign:
 				bond_pad_hole_positive = gdstk.rectangle( (bl[0]-self.io['aSi_etch']['x_buffer_um'], bl[1]+self.io['pads']['height_um']-self.io['pads']['pad_exposed_height_um']), (tr[0]+self.io['aSi_etch']['x_buffer_um'], tr[1]+self.io['aSi_etch']['extend_towards_edge_um'] ) )
 				
 			# Trim the rectangle so it doesn't extend over the edge of the chip
-			new_bpl_list = gdstk.boolean(self.bulk, bond_pad_hole_positive, "and", layer=self.layers["aSi"])
-			for nbpl in new_bpl_list:
-				self.bond_pad_hole.append(nbpl)
+			bulk_bb = self.bulk.bounding_box()
+			self.bond_pad_hole.extend(clip_to_box([bond_pad_hole_positive], bulk_bb[0], bulk_bb[1], layer=self.layers["aSi"]))
 		
 		# Add groundplane layer
-		for pad in self.temp_pads:
+		for pad in flat_pads:
 			
 			bl = pad[0]
 			tr = pad[1]
@@ -724,10 +1987,8 @@ class ChipDesign:
 					last_height -= seg_l
 					bond_pad_hole_positive.segment((tr[0]-self.io['pads']['width_um']/2, last_height), seg_w+seg_g*2)
 			
-			# Trim the rectangle so it doesn't extend over the edge of the chip
-			gnd_list = gdstk.boolean(self.gnd, bond_pad_hole_positive, "not", layer=self.layers["GND"])
-			
-			self.gnd = gnd_list
+			# Cut from ground plane, which also trims it to the edge of the chip
+			self.gnd_cutouts.extend(bond_pad_hole_positive.to_polygons())
 		
 		# This should be moved to build I think
 		if self.NbTiN_is_etch:
@@ -750,13 +2011,14 @@ class ChipDesign:
 			
 			if self.reticle_fiducial['on_gnd']:
 				
-				# Subtract text from ground
-				for f in self.fiducials:
-					self.gnd = gdstk.boolean(self.gnd, f, "not", layer=self.layers["GND"])
+				# Subtract fiducials from ground
+				self.gnd_cutouts.extend(self.fiducials)
 				
 				# Clear fiducial list
 				self.fiducials = []
-	
+		
+		self.resolve_gnd_cutouts()
+		
 		return True
 		
 		
@@ -787,374 +2049,170 @@ class ChipDesign:
 		center_circ_diameter = self.reversal['diameter_um']
 		circ_num_pts = self.reversal['num_points']//2
 		
-		# Make path for 1-direction of spiral (Polar)
-		theta1 = np.linspace(spiral_rot_offset, spiral_rot_offset+2*PI*spiral_num, self.spiral["num_points"]//2)
-		R1 = (theta1-spiral_rot_offset)*spiral_b + center_circ_diameter
-		
+		# Get number of half-rotations for the second spiral. When both IO lines are
+		# on the same side, add half a rotation so they end on the same side.
 		if self.io['same_side']:
-			# Make path for other direction of spiral (Polar) (add half rotation so end on same side)
-			theta2 = np.linspace(spiral_rot_offset, spiral_rot_offset+2*PI*(spiral_num+0.5), round(self.spiral["num_points"]/2*(spiral_num+0.5)/spiral_num))
-			R2 = (theta2-spiral_rot_offset)*spiral_b + center_circ_diameter
+			spiral_num2 = spiral_num+0.5
 		else:
-			# Make path for other direction of spiral (Polar)
-			theta2 = np.linspace(spiral_rot_offset, spiral_rot_offset+2*PI*(spiral_num), round(self.spiral["num_points"]/2*(spiral_num+0.5)/spiral_num))
-			R2 = (theta2-spiral_rot_offset)*spiral_b + center_circ_diameter
+			spiral_num2 = spiral_num
+		
+		# Get spiral point spacing. If max_chord_error_um is given, points are placed
+		# by local curvature instead of evenly spaced by num_points.
+		max_chord_error = self.spiral.get('max_chord_error_um', None)
+		
+		if max_chord_error is None:
+			# Make path for 1-direction of spiral (Polar)
+			theta1 = np.linspace(spiral_rot_offset, spiral_rot_offset+2*PI*spiral_num, self.spiral["num_points"]//2)
 			
-		# Convert spirals to cartesian
-		X1 = R1*np.cos(theta1)
-		Y1 = R1*np.sin(theta1)
-		X2 = -1*R2*np.cos(theta2)
-		Y2 = -1*R2*np.sin(theta2)
+			# Make path for other direction of spiral (Polar)
+			theta2 = np.linspace(spiral_rot_offset, spiral_rot_offset+2*PI*spiral_num2, round(self.spiral["num_points"]/2*(spiral_num+0.5)/spiral_num))
+		else:
+			theta1 = spiral_theta(spiral_rot_offset, spiral_rot_offset+2*PI*spiral_num, spiral_b, center_circ_diameter, max_chord_error)
+			theta2 = spiral_theta(spiral_rot_offset, spiral_rot_offset+2*PI*spiral_num2, spiral_b, center_circ_diameter, max_chord_error)
+			debug(f"Adaptive spiral sampling selected >{len(theta1)+len(theta2)}< points.")
+			if len(theta1)+len(theta2) > self.spiral.get("num_points", np.inf):
+				warning(f"Adaptive spiral sampling needs >{len(theta1)+len(theta2)}< points to meet max_chord_error_um=>{max_chord_error} um<, more than num_points=>{self.spiral['num_points']}<.")
+		
+		R1 = (theta1-spiral_rot_offset)*spiral_b + center_circ_diameter
+		R2 = (theta2-spiral_rot_offset)*spiral_b + center_circ_diameter
+		
+		# Convert spirals to cartesian. Each spiral is kept as an Nx2 array of
+		# [x, y] points for the remainder of the build.
+		spiral1 = np.column_stack((R1*np.cos(theta1), R1*np.sin(theta1)))
+		spiral2 = np.column_stack((-1*R2*np.cos(theta2), -1*R2*np.sin(theta2)))
 		
 		### Select spiral Y-offset/ Check fits on wafer ------------
 		#
 		
-		if self.io['same_side']:
+		# Get X and Y bounds
+		y_max = max(spiral1[:, 1].max(), spiral2[:, 1].max())
+		y_min = min(spiral1[:, 1].min(), spiral2[:, 1].min())
 		
-			# Get X and Y bounds
-			allYs = list(Y1)+list(Y2)
-			allXs = list(X1)+list(X2)
-			y_max = np.max(allYs)
-			y_min = np.min(allYs)
-			x_max = np.max(allXs)
-			x_min = np.min(allXs)
-			dY = y_max - y_min
-			dX = x_max - x_min
-			upper_bound = self.chip_size_um[1]/2
-			lower_bound = -self.chip_size_um[1]/2 + self.io['inner']['y_line_offset_um'] + self.pad_height
-			
-			# Check fit
-			allowed_size = upper_bound - lower_bound - self.spiral_io_buffer_um - self.chip_edge_buffer_um
-			if dY > allowed_size:
-				error(f"Cannot fit spiral in Y-dimension. Spiral height >{dY} um< \\> allowed region >{allowed_size} um<.")
-				return False
-			
-			# Get height from bottom
-			spiral_y_offset = lower_bound + self.spiral_io_buffer_um + (allowed_size - dY)/2 + abs(y_min)
-			debug(f"Selected spiral Y offset of >{spiral_y_offset} um<.")
-			debug(f"Spiral lower margin: >{self.spiral_io_buffer_um+(allowed_size-dY)/2} um<.")
-			debug(f"Spiral upper margin: >{self.chip_edge_buffer_um+(allowed_size-dY)/2} um<.")
+		# Check fit
+		fit = self.calc_y_fit(y_min, y_max)
+		if not fit['fits']:
+			dY = fit['height_um']
+			allowed_size = fit['allowed_height_um']
+			error(f"Cannot fit spiral in Y-dimension. Spiral height >{dY} um< \\> allowed region >{allowed_size} um<.")
+			return False
 		
-		else:
-			
-			# Get X and Y bounds
-			allYs = list(Y1)+list(Y2)
-			allXs = list(X1)+list(X2)
-			y_max = np.max(allYs)
-			y_min = np.min(allYs)
-			x_max = np.max(allXs)
-			x_min = np.min(allXs)
-			dY = y_max - y_min
-			dX = x_max - x_min
-			upper_bound = self.chip_size_um[1]/2 - self.io['outer']['y_line_offset_um'] - self.pad_height
-			lower_bound = -self.chip_size_um[1]/2 + self.io['inner']['y_line_offset_um'] + self.pad_height
-			
-			# Check fit
-			allowed_size = upper_bound - lower_bound - self.spiral_io_buffer_um - self.chip_edge_buffer_um
-			if dY > allowed_size:
-				error(f"Cannot fit spiral in Y-dimension. Spiral height >{dY} um< \\> allowed region >{allowed_size} um<.")
-				return False
-			
-			# Get height from bottom
-			spiral_y_offset = lower_bound + self.spiral_io_buffer_um + (allowed_size - dY)/2 + abs(y_min)
-			debug(f"Selected spiral Y offset of >{spiral_y_offset} um<.")
-			debug(f"Spiral lower margin: >{self.spiral_io_buffer_um+(allowed_size-dY)/2} um<.")
-			debug(f"Spiral upper margin: >{self.chip_edge_buffer_um+(allowed_size-dY)/2} um<.")
+		# Get height from bottom
+		spiral_y_offset = fit['y_offset_um']
+		debug(f"Selected spiral Y offset of >{spiral_y_offset} um<.")
+		debug(f"Spiral lower margin: >{fit['lower_margin_um']} um<.")
+		debug(f"Spiral upper margin: >{fit['upper_margin_um']} um<.")
 		
-		#TODO: Check X placement
+		# Check X placement
+		x_fit = self.calc_x_fit(min(spiral1[:, 0].min(), spiral2[:, 0].min()), max(spiral1[:, 0].max(), spiral2[:, 0].max()))
+		if not x_fit['fits']:
+			error(f"Cannot fit spiral in X-dimension. Spiral width >{x_fit['width_um']} um< \\> allowed region >{x_fit['allowed_width_um']} um<.")
+			return False
+		debug(f"Spiral left margin: >{x_fit['left_margin_um']} um<.")
+		debug(f"Spiral right margin: >{x_fit['right_margin_um']} um<.")
 		
 		#
 		#### End choose spiral position --------------------
 		
+		# Move spirals to selected height. Spiral 1 is reversed so the path runs
+		# from the outside of spiral 1, through the center, to the outside of spiral 2.
+		y_shift = np.array([0, spiral_y_offset])
+		path_list1 = spiral1[::-1] + y_shift
+		path_list2 = spiral2 + y_shift
+		
+		# Add tails so there are no gaps when connecting to IO components
+		tail_1 = np.array([[path_list1[0, 0], path_list1[0, 1]-self.spiral['tail_length_um']]])
+		if self.io['same_side']:
+			tail_2 = np.array([[path_list2[-1, 0], path_list2[-1, 1]-self.spiral['tail_length_um']]])
+		else:
+			tail_2 = np.array([[path_list2[-1, 0], path_list2[-1, 1]+self.spiral['tail_length_um']]])
+		
 		# Add in spiral reversals
-		if self.reversal['mode'].upper() == "CIRCLE": # Use circles to reverse direction
-		
-			# Create center circles
-			theta_circ1 = np.linspace(0, PI, circ_num_pts)
-			theta_circ2 = np.linspace(PI, 2*PI, circ_num_pts)
-			
-			# Convert circles to cartesian
-			Xc1 = center_circ_diameter/2*np.cos(theta_circ1)-center_circ_diameter/2
-			Yc1 = center_circ_diameter/2*np.sin(theta_circ1)
-			Xc2 = center_circ_diameter/2*np.cos(theta_circ2)+center_circ_diameter/2
-			Yc2 = center_circ_diameter/2*np.sin(theta_circ2)
-			
-			# Change format
-			path_list1 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(X1, Y1)]
-			path_list1.reverse()
-			path_list2 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(X2, Y2)]
-			circ_list1 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(Xc1, Yc1)]
-			circ_list1.reverse()
-			circ_list2 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(Xc2, Yc2)]
-			
-			# Add tails so there are no gaps when connecting to IO components
-			tail_1 = [[path_list1[0][0], path_list1[0][1]-self.spiral['tail_length_um']]]
-			if self.io['same_side']:
-				tail_2 = [[path_list2[-1][0], path_list2[-1][1]-self.spiral['tail_length_um']]]
-			else:
-				tail_2 = [[path_list2[-1][0], path_list2[-1][1]+self.spiral['tail_length_um']]]
-			
-			# Union all components
-			path_list = tail_1 + path_list1 + circ_list1 + circ_list2 + path_list2 + tail_2
+		if self.reversal['mode'].upper() not in ["CIRCLE", "CIRCLE_SMOOTH"]:
+			error(f"Failed to recognize reversal mode >{self.reversal['mode']}<.")
+			return False
 		
-		elif self.reversal['mode'].upper() == "CIRCLE_SMOOTH": # Use circles with a straight-shot into the circle to prevent sharp angles
-			
-			# Change format
-			path_list1 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(X1, Y1)]
-			path_list1.reverse()
-			path_list2 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(X2, Y2)]
-			
-			
-			# Add tails so there are no gaps when connecting to IO components
-			tail_1 = [[path_list1[0][0], path_list1[0][1]-self.spiral['tail_length_um']]]
-			if self.io['same_side']:
-				tail_2 = [[path_list2[-1][0], path_list2[-1][1]-self.spiral['tail_length_um']]]
-			else:
-				tail_2 = [[path_list2[-1][0], path_list2[-1][1]+self.spiral['tail_length_um']]]
+		if self.reversal['mode'].upper() == "CIRCLE_SMOOTH": # Use circles with a straight-shot into the circle to prevent sharp angles
 			
 			# On inner most spirals, find where tangent is vertical. Stop spiral and extend ---------
 			# vertically so it matches smoothly with the circle reversal caps:
 			
-			# Find start point for path1
-			last_x1 = None
-			idx_x1 = None
-			for idx, coord in enumerate(reversed(path_list1)):
-				
-				# Initilize
-				if idx == 0:
-					last_x1 = coord[0]
-					continue
-				
-				# Find where x-direction reverses
-				if coord[0] >= last_x1:
-					idx_x1 = idx
-					break
-				else:
-					last_x1 = coord[0]
-				
+			# The spirals start at the center, with spiral 1 moving in -X and spiral 2 in +X
+			idx_x1 = first_reversal(path_list1[::-1, 0], -1)
+			idx_x2 = first_reversal(path_list2[:, 0], 1)
+			if idx_x1 is None or idx_x2 is None:
+				error("Failed to find vertical tangent on inner spiral.")
+				return False
 			
-			# Modify spiral path
-			final_y = path_list1[-1][1]
-			path_list1 = path_list1[0:-idx_x1]
-			path_list1.append([last_x1, final_y])
+			# Modify spiral paths. The point before the reversal is replaced with a
+			# point level with the spiral start, so the spiral meets the circle vertically.
+			last_x1 = path_list1[-idx_x1, 0]
+			path_list1 = np.vstack((path_list1[0:-idx_x1], [[last_x1, path_list1[-1, 1]]]))
 			
-			# Find start point for path1
-			last_x2 = None
-			idx_x2 = None
-			for idx, coord in enumerate(path_list2):
-				
-				# Initilize
-				if idx == 0:
-					last_x2 = coord[0]
-					continue
-				
-				# Find where x-direction reverses
-				if coord[0] <= last_x2:
-					idx_x2 = idx
-					break
-				else:
-					last_x2 = coord[0]
-			
-			# Modify spiral path
-			final_y = path_list2[0][1]
-			path_list2 = path_list2[idx_x2:]
-			path_list2.insert(0, [last_x2, final_y])
+			last_x2 = path_list2[idx_x2-1, 0]
+			path_list2 = np.vstack(([[last_x2, path_list2[0, 1]]], path_list2[idx_x2:]))
 			
 			# Modify diameter to match spirals
 			center_circ_diameter = abs(last_x1)
 			
 			# End trim spiral inners --------------------
-			
-			# Create center circles
-			theta_circ1 = np.linspace(0, PI, circ_num_pts)
-			theta_circ2 = np.linspace(PI, 2*PI, circ_num_pts)
-			
-			# Convert circles to cartesian
-			Xc1 = center_circ_diameter/2*np.cos(theta_circ1)-center_circ_diameter/2
-			Yc1 = center_circ_diameter/2*np.sin(theta_circ1)
-			Xc2 = center_circ_diameter/2*np.cos(theta_circ2)+center_circ_diameter/2
-			Yc2 = center_circ_diameter/2*np.sin(theta_circ2)
-			
-			circ_list1 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(Xc1, Yc1)]
-			circ_list1.reverse()
-			circ_list2 = [[x_, y_+spiral_y_offset] for x_, y_ in zip(Xc2, Yc2)]
-			
-			# Union all components
-			path_list = tail_1 + path_list1 + circ_list1 + circ_list2 + path_list2 + tail_2
+		
+		# Create center circles
+		if max_chord_error is not None:
+			circ_num_pts = arc_num_points(center_circ_diameter/2, PI, max_chord_error)
+		circ_radius = center_circ_diameter/2
+		circ_list1 = arc_template("UPPER_HALF", circ_radius, circ_num_pts)[::-1] + [-circ_radius, 0] + y_shift
+		circ_list2 = arc_template("LOWER_HALF", circ_radius, circ_num_pts) + [circ_radius, 0] + y_shift
+		
+		# Union all components
+		path_list = np.concatenate((tail_1, path_list1, circ_list1, circ_list2, path_list2, tail_2))
 		
 		#### Extend spiral with straight regions as specified --------------------
 		#
 		
 		# Shift everything down and to the left by half
-		for pl in path_list:
-			pl[0] -= self.spiral['horiz_stretch_um']//2
-			pl[1] -= self.spiral['vert_stretch_um']//2
-		
-		#///////////// Perform vertical stretching //////////////////
+		path_list -= np.array([self.spiral['horiz_stretch_um']//2, self.spiral['vert_stretch_um']//2])
 		
-		# Initialize, find when dX changes sign
-		last_sdX = 0
-		
-		idx_reversal_pt = len(tail_1) + len(path_list1) + len(circ_list1)
-		idx_horiz_lock = len(tail_1) + len(path_list1)
-		idx_horiz_unlock = len(tail_1) + len(path_list1) + len(circ_list1) + len(circ_list2)
-		
-		# Scan over all points
-		idx = 0
-		while True:
-			idx += 1
-			
-			# Check for end condition
-			if idx >= len(path_list):
-				break
-			
-			# If dX is zero, skip point
-			if path_list[idx][0] - path_list[idx-1][0] == 0:
-				sdX = last_sdX
-			else:
-				# Get sign of dX
-				sdX = (path_list[idx][0] - path_list[idx-1][0])/abs(path_list[idx][0] - path_list[idx-1][0] )
-			
-			# Check for change
-			if (last_sdX != sdX) or (idx == idx_reversal_pt):
-				# Change occured
-				
-				# Duplicate last point
-				path_list.insert(idx, [path_list[idx-1][0], path_list[idx-1][1]])
-				
-				# Get sign of Y change
-				dY = (path_list[idx][1]-path_list[idx-1][1])
-				sign_incr = 1
-				while abs(dY) < 0.1:
-					sign_incr += 1
-					dY = (path_list[idx][1]-path_list[idx-sign_incr][1])
-					if sign_incr >= 10:
-						logging.error("Failed to identify change in direction while extending spiral.")
-						return False
-				sign_val = dY/abs(dY)
-				
-				# print(f"dY sign = {sign_val}, |dY| = {abs(dY)}")
-				
-				# Shift all remaining points up/down
-				for si in range(idx, len(path_list)):
-					
-					# Modify Y values
-					path_list[si][1] += self.spiral['vert_stretch_um'] * sign_val
-				
-				# Increment index to account for added point
-				idx += 1
-				if idx < idx_reversal_pt:
-					idx_reversal_pt += 1
-				if idx < idx_horiz_lock:
-					idx_horiz_lock += 1
-				if idx < idx_horiz_unlock:
-					idx_horiz_unlock += 1
-				
-				
-				# Update last_sdX
-				last_sdX = sdX
+		#///////////// Perform vertical stretching //////////////////
+		
+		# Track the start of the reversal caps and the point where they meet.
+		# These are updated by stretch_path() as points are inserted.
+		idx_reversal_pt = len(tail_1) + len(path_list1) + len(circ_list1)
+		idx_horiz_lock = len(tail_1) + len(path_list1)
+		idx_horiz_unlock = len(tail_1) + len(path_list1) + len(circ_list1) + len(circ_list2)
+		markers = [idx_reversal_pt, idx_horiz_lock, idx_horiz_unlock]
+		
+		# Stretch wherever dX changes sign, and always at the reversal point
+		signs = carry_sign(np.diff(path_list[:, 0]), np.diff(path_list[:, 0]) == 0, 0)
+		path_list = stretch_path(path_list, self.spiral['vert_stretch_um'], 1, signs, markers, force_marker=0)
+		if path_list is None:
+			return False
 		
 		#///////////// Perform horizontal stretching //////////////////
 		
 		# Get sign of last dY change
 		sign_incr = 1
-		last_sdY = (path_list[sign_incr][1]-path_list[0][1])
+		last_sdY = (path_list[sign_incr, 1]-path_list[0, 1])
 		while abs(last_sdY) < 0.1:
 			sign_incr += 1
-			last_sdY = (path_list[sign_incr][1]-path_list[0][1])
+			last_sdY = (path_list[sign_incr, 1]-path_list[0, 1])
 			if sign_incr >= 10:
-				logging.error("Failed to identify change in direction while extending spiral.")
+				error("Failed to identify change in direction while extending spiral.")
 				return False
 		last_sdY = last_sdY/abs(last_sdY)
 		
-		# path_list.reverse()
-		
-		# Scan over all points
-		idx = 0
-		while True:
-			idx += 1
-			
-			# Check for end condition
-			if idx >= len(path_list):
-				break
-			
-			# If dY is zero, skip point
-			if abs(path_list[idx][1] - path_list[idx-1][1]) < 0.01:
-				sdY = last_sdY
-			else:
-				
-				# # Get sign of last dY change
-				# sign_incr = 0
-				# sdY = (path_list[idx+sign_incr][1]-path_list[idx][1])
-				# while abs(sdY) < 0.1:
-				# 	sign_incr += 1
-				# 	sdY = (path_list[idx+sign_incr][1]-path_list[idx-1][1])
-				# 	if sign_incr >= 10:
-				# 		logging.error("Failed to identify change in direction while extending spiral.")
-				# 		return False
-				# sdY = sdY/abs(sdY)
-				
-				# Get sign of dY
-				sdY = (path_list[idx][1] - path_list[idx-1][1])/abs(path_list[idx][1] - path_list[idx-1][1])
-			
-			# Check for change
-			if (last_sdY != sdY):
-				# Change occured
-				
-				# Duplicate last point
-				path_list.insert(idx, [path_list[idx-1][0], path_list[idx-1][1]])
-				
-				# Get sign of X change
-				dX = (path_list[idx][0]-path_list[idx-1][0])
-				sign_incr = 1
-				while abs(dX) < 0.1:
-					sign_incr += 1
-					dX = (path_list[idx][0]-path_list[idx-sign_incr][0])
-					if sign_incr >= 10:
-						logging.error("Failed to identify change in direction while extending spiral.")
-						return False
-				sign_val = dX/abs(dX)
-				
-				# For center reversals, divide delta evenly
-				if idx > idx_horiz_lock and idx < idx_horiz_unlock:
-					sign_val /= 2
-				
-				# Shift all remaining points up/down
-				for si in range(idx, len(path_list)):
-					
-					# Modify X values
-					path_list[si][0] += self.spiral['horiz_stretch_um'] * sign_val
-				
-				# Increment index to account for added point
-				idx += 1
-				if idx < idx_reversal_pt:
-					idx_reversal_pt += 1
-				if idx < idx_horiz_lock:
-					idx_horiz_lock += 1
-				if idx < idx_horiz_unlock:
-					idx_horiz_unlock += 1
-				
-				# Update last_sdX
-				last_sdY = sdY
-		
-		# path_list.reverse()
+		# Stretch wherever dY changes sign. Runs inside the reversal caps are split
+		# between the two halves of the cap.
+		dY_all = np.diff(path_list[:, 1])
+		signs = carry_sign(dY_all, np.abs(dY_all) < 0.01, last_sdY)
+		path_list = stretch_path(path_list, self.spiral['horiz_stretch_um'], 0, signs, markers, halve_markers=(1, 2))
+		if path_list is None:
+			return False
 		
 		#
 		##### End extend spirals -----------------------------------
 		
 		# Calcualte total length of spiral
-		last_point = None
-		spiral_length = 0
-		for pt in path_list:
-			
-			# Initialize
-			if last_point is None:
-				last_point = pt
-				continue
-			
-			# Otherwise add delta
-			spiral_length += np.sqrt((pt[0] - last_point[0])**2 + (pt[1] - last_point[1])**2)
-			last_point = pt
+		spiral_length = np.sum(np.hypot(np.diff(path_list[:, 0]), np.diff(path_list[:, 1])))
 		
 		info(f"Total spiral length: >{spiral_length} um<.")
 		self.total_line_length += spiral_length
@@ -1164,135 +2222,49 @@ class ChipDesign:
 		##================ MAKE STEPPED IMPEDANCE STRUCTURES
 		#
 		
-		def approx_sign(val:float, tol:float):
-			
-			if np.abs(val) <= np.abs(tol):
-				return 0
-			
-			return np.sign(val)
-		
 		if not self.use_steps:
 			self.path = gdstk.FlexPath(path_list, self.tlin['Wcenter_um'], tolerance=1e-2, layer=self.layers["NbTiN"])
 		
 		else:
 			
-			# Prepare a flexpath with first point
-			self.path = gdstk.FlexPath(path_list[0], width=self.ZH_step_width_um, joins='natural', tolerance=3e-2)
-			
-			# Scan over path, checking for distance traveled
-			point_last = path_list[0]
-			distance = 0
-			is_on_step = False
-			# for pl in path_list[1:]:
-			
-			all_x_debug = [path_list[0][0]]
-			all_y_debug = [path_list[0][1]]
+			# Find all step boundaries along the path at once
+			step_points, on_step, num_ZL_sections = segment_steps(path_list, self.step_spacing_um, self.step_length_um, self.steps['step_perturbation_um'])
+			widths = np.where(on_step, self.step_width_um, self.ZH_step_width_um)
 			
-			x_wide = []
-			x_narrow = []
-			y_wide = []
-			y_narrow = []
+			t_emit = time.perf_counter()
 			
-			num_ZL_sections = 0
-			
-			path_list_idx = 1
-			while path_list_idx < len(path_list):
-				# Using a while-loop because when a point is interpolated, it is added to the list,
-				# and it's not cool to for-loop over a dynamically changing list. Note we're 
-				# starting at index 1!
+			if self.step_emitter.upper() == "FLEXPATH":
 				
-				# Save a local variable for ease of use, like in a for loop
-				pl = path_list[path_list_idx]
+				# Prepare a flexpath with first point
+				self.path = gdstk.FlexPath(step_points[0], width=widths[0], joins='natural', tolerance=3e-2)
 				
-				# Update distance 
-				segment_length = np.sqrt( (pl[0]-point_last[0])**2 + (pl[1]-point_last[1])**2 )
-				new_distance = distance + segment_length
+				# Add each run of constant width in one call. The first point of each run
+				# is added on its own, so the width only tapers over the perturbation.
+				idx_changes = np.flatnonzero(np.diff(widths)) + 1
+				run_starts = np.concatenate(([1], idx_changes))
+				run_ends = np.concatenate((idx_changes, [len(step_points)]))
+				for idx_start, idx_end in zip(run_starts, run_ends):
+					if idx_start != 1:
+						self.path.segment(step_points[idx_start], width=widths[idx_start])
+						idx_start += 1
+					if idx_start < idx_end:
+						self.path.segment(step_points[idx_start:idx_end], width=widths[idx_start])
 				
-				# Pick between step spacing or length
-				if is_on_step:
-					targ_distance = self.step_length_um
-				else:
-					targ_distance = self.step_spacing_um
+				num_vertices = len(step_points)
 				
-				# If past distance, change step
-				if new_distance >= targ_distance: # Need to interpolate and add step!
-					
-					# Interpolate new point to use
-					frac_usage = (targ_distance - distance)/segment_length # Fraction of segment length needed to get to target step length
-					dx = pl[0]-point_last[0]
-					dy = pl[1]-point_last[1]
-					interp_x = dx*frac_usage + point_last[0] # Get interpolated X
-					interp_y = dy*frac_usage + point_last[1] # Get interpolated Y
-					
-					e_x = dx/segment_length*self.steps['step_perturbation_um']
-					e_y = dy/segment_length*self.steps['step_perturbation_um']
-					
-					if (e_x**2 + e_y**2)**0.5 > self.steps['step_perturbation_um']*1.01:
-						error(f"ex = {e_x}, e_y = {e_y}")
-					
-					if frac_usage >= 1:
-						print(f"ex = {e_x}, e_y = {e_y}")
-					
-					interp_x_e = interp_x - e_x # Get interpolated X slightly perturbed
-					interp_y_e = interp_y - e_y # Get interpolated Y slightly perturbed
-					
-					# Add interpolated points to path
-					if is_on_step:
-						self.path.segment([interp_x_e, interp_y_e], width=self.step_width_um)
-						self.path.segment([interp_x, interp_y], width=self.ZH_step_width_um)
-						
-						x_wide.append(interp_x_e)
-						x_narrow.append(interp_x)
-						
-						y_wide.append(interp_y_e)
-						y_narrow.append(interp_y)
-					else:
-						
-						num_ZL_sections += 1
-						
-						self.path.segment([interp_x_e, interp_y_e], width=self.ZH_step_width_um)
-						self.path.segment([interp_x, interp_y], width=self.step_width_um)
-						
-						x_narrow.append(interp_x_e)
-						x_wide.append(interp_x)
-						
-						y_narrow.append(interp_y_e)
-						y_wide.append(interp_y)
-					
-					all_x_debug.append(interp_x_e)
-					all_x_debug.append(interp_x)
-					all_y_debug.append(interp_y_e)
-					all_y_debug.append(interp_y)
-					
-					is_on_step = (not is_on_step) # Toggle width
-					point_last = [interp_x, interp_y] # Update last point
-					distance = 0 # Reset distance
-					#NOTE: Do NOT increment index!
-					
-				else: # Continuing last step - just add the exisiting point to the list
-					
-					# Add to path
-					if is_on_step:
-						self.path.segment(pl, width=self.step_width_um)
-					else:
-						self.path.segment(pl, width=self.ZH_step_width_um)
-					
-					all_x_debug.append(pl[0])
-					all_y_debug.append(pl[1])
-					
-					# Update last point
-					point_last = pl
-					distance = new_distance
-					
-					# Increment index
-					path_list_idx += 1
-		
-		# plt.plot(all_x_debug, all_y_debug, marker='.', linewidth=0.2, linestyle=':')
-		# plt.scatter(x_narrow, y_narrow, marker='v')
-		# plt.scatter(x_wide, y_wide, marker='^')
-		# plt.show()
-		
-		
+			elif self.step_emitter.upper() == "POLYGON":
+				
+				# Write outline of stepped line directly
+				self.path = strip_polygon(step_points, widths, layer=self.layers["NbTiN"])
+				num_vertices = self.path.size
+				
+			else:
+				error(f"Failed to recognize step emitter >{self.step_emitter}<.")
+				return False
+			
+			t_emit = time.perf_counter() - t_emit
+			debug(f"Stepped line emitted as >{self.step_emitter.upper()}< with >{num_vertices}< vertices in >{rd(t_emit*1e3, 3)} ms<.")
+			
 			info(f"Added {num_ZL_sections} low impedance steps.")
 			self.total_number_steps += num_ZL_sections
 		#
@@ -1318,7 +2290,11 @@ class ChipDesign:
 		# ---------------------------------------------------------------------
 		# Build IO structures (meandered lines and bond pads)
 		
-		if self.reticle_fiducial['type'].upper() == "L_CORNER":
+		if self.reticle_fiducial['type'].upper() == "L_CORNER" and self.use_shared_cells:
+			
+			self.place_fiducial_cells()
+		
+		elif self.reticle_fiducial['type'].upper() == "L_CORNER":
 			
 			# Define local coordinates
 			x_right = self.chip_size_um[0]//2
@@ -1348,8 +2324,16 @@ class ChipDesign:
 		# ---------------------------------------------------------------------
 		# Add objects to chip design
 		
+		# Place bond pads from shared pad cells, or build each one directly
+		if self.use_shared_cells:
+			aSi_pads = self.place_pad_cells()
+			flat_pads = []
+		else:
+			aSi_pads = self.temp_pads
+			flat_pads = self.temp_pads
+		
 		# Add Al layer
-		for pad in self.temp_pads:
+		for pad in flat_pads:
 			
 			bl = pad[0]
 			tr = pad[1]
@@ -1360,7 +2344,7 @@ class ChipDesign:
 		#TODO: Check file for if aSi is etch or releif
 		
 		# Add aSi etch layer
-		for pad in self.temp_pads:
+		for pad in aSi_pads:
 			
 			bl = pad[0]
 			tr = pad[1]
@@ -1375,12 +2359,11 @@ class ChipDesign:
 				bond_pad_hole_positive = gdstk.rectangle( (bl[0]-self.io['aSi_etch']['x_buffer_um'], bl[1]+self.io['pads']['height_um']-self.io['pads']['pad_exposed_height_um']), (tr[0]+self.io['aSi_etch']['x_buffer_um'], tr[1]+self.io['aSi_etch']['extend_towards_edge_um'] ) )
 				
 			# Trim the rectangle so it doesn't extend over the edge of the chip
-			new_bpl_list = gdstk.boolean(self.bulk, bond_pad_hole_positive, "and", layer=self.layers["aSi"])
-			for nbpl in new_bpl_list:
-				self.bond_pad_hole.append(nbpl)
+			bulk_bb = self.bulk.bounding_box()
+			self.bond_pad_hole.extend(clip_to_box([bond_pad_hole_positive], bulk_bb[0], bulk_bb[1], layer=self.layers["aSi"]))
 		
 		# Add groundplane layer
-		for pad in self.temp_pads:
+		for pad in flat_pads:
 			
 			bl = pad[0]
 			tr = pad[1]
@@ -1420,16 +2403,8 @@ class ChipDesign:
 					last_height -= seg_l
 					bond_pad_hole_positive.segment((tr[0]-self.io['pads']['width_um']/2, last_height), seg_w+seg_g*2)
 			
-			# Trim the rectangle so it doesn't extend over the edge of the chip
-			gnd_list = gdstk.boolean(self.gnd, bond_pad_hole_positive, "not", layer=self.layers["GND"])
-			
-			# # Unpack list to single object
-			# if len(gnd_list) != 1:
-			# 	error("Failed to generate ground plane")
-			# 	return False
-			# else:
-			# 	self.gnd = gnd_list[0]
-			self.gnd = gnd_list
+			# Cut from ground plane, which also trims it to the edge of the chip
+			self.gnd_cutouts.extend(bond_pad_hole_positive.to_polygons())
 			
 		# ---------------------------------------------------------------------
 		# Add objects to chip design
@@ -1501,40 +2476,215 @@ class ChipDesign:
 			
 			if self.reticle_fiducial['on_gnd']:
 				
-				# Subtract text from ground
-				for f in self.fiducials:
-					self.gnd = gdstk.boolean(self.gnd, f, "not", layer=self.layers["GND"])
+				# Subtract fiducials from ground
+				self.gnd_cutouts.extend(self.fiducials)
 				
 				# Clear fiducial list
 				self.fiducials = []
-	
+		
+		self.resolve_gnd_cutouts()
+		
 		return True
 	
-	def calc_taper_width(self, z:float):
-		""" Calculates the width of the line given the specified taper. 
+	def place_pad_cells(self):
+		""" Places each bond pad in temp_pads as a reference to a shared pad cell
+		(see pad_cell()), and queues its ground plane cutout. If the aSi opening
+		would need trimming at the side of the chip, it is left out of the cell.
+		Returns the pads whose aSi openings must be added directly. """
+		
+		baseline_offset = self.chip_size_um[1]//2 # Offset to translate (y = 0) to actual bottom of chip
+		bulk_bb = self.bulk.bounding_box()
+		aSi_half_width = self.io['pads']['width_um']/2 + self.io['aSi_etch']['x_buffer_um']
+		
+		aSi_pads = []
+		for pad in self.temp_pads:
+			
+			bl = pad[0]
+			tr = pad[1]
+			x_center = (bl[0] + tr[0])/2
+			
+			# Check if aSi opening fits across chip
+			include_aSi = (x_center - aSi_half_width >= bulk_bb[0][0]) and (x_center + aSi_half_width <= bulk_bb[1][0])
+			if not include_aSi:
+				aSi_pads.append(pad)
+			
+			cell, gnd_cutout = pad_cell(self.io, self.layers, include_aSi)
+			
+			# Pad cells are drawn for the bottom edge, so rotate pads on top edge
+			if np.sign(bl[1]) < 0:
+				origin = (x_center, -baseline_offset)
+				rotation = 0
+			else:
+				origin = (x_center, baseline_offset)
+				rotation = np.pi
+			
+			self.cell_refs.append(gdstk.Reference(cell, origin, rotation))
+			
+			for gc in gnd_cutout:
+				self.gnd_cutouts.append(gc.copy().rotate(rotation).translate(origin[0], origin[1]))
+		
+		return aSi_pads
+	
+	def place_fiducial_cells(self):
+		""" Places the reticle fiducials as a single reference to a shared fiducial
+		set cell (see fiducial_set_cell()). If the fiducials are on the ground
+		plane, the cached cutout is queued instead. """
+		
+		cell, gnd_cutout = fiducial_set_cell(self.reticle_fiducial, self.chip_size_um, self.layers)
+		
+		if self.reticle_fiducial['on_gnd'] and not self.NbTiN_is_etch:
+			for gc in gnd_cutout:
+				self.gnd_cutouts.append(gc.copy())
+		else:
+			self.cell_refs.append(gdstk.Reference(cell))
+	
+	def check_text_cell_cutouts(self):
+		''' Moves the padded boxes of engraved text cells (see place_text_cells())
+		into the queued ground plane cutouts. Each cell fills the ground plane back
+		in around its text, so its box must lie inside the ground plane and clear
+		of every other cutout. Lines which do not are engraved directly instead, by
+		cutting out the text and removing the reference. '''
+		
+		# Returns the polygons in others whose bounding box overlaps poly's
+		def near(poly, others):
+			(x0, y0), (x1, y1) = poly.bounding_box()
+			found = []
+			for o in others:
+				(ox0, oy0), (ox1, oy1) = o.bounding_box()
+				if ox0 < x1 and ox1 > x0 and oy0 < y1 and oy1 > y0:
+					found.append(o)
+			return found
+		
+		boxes = [tc for tc, ref in self.text_cell_cutouts]
+		cutouts = list(self.gnd_cutouts)
+		
+		for idx, (box, ref) in enumerate(self.text_cell_cutouts):
+			
+			outside = gdstk.boolean(box, near(box, self.gnd), "not")
+			overlaps = gdstk.boolean(box, near(box, cutouts + boxes[:idx] + boxes[idx+1:]), "and")
+			
+			if len(outside) < 1 and len(overlaps) < 1:
+				self.gnd_cutouts.append(box)
+			else:
+				warning(f"Engraved text cell at >({rd(ref.origin[0], 3)}, {rd(ref.origin[1], 3)})< is not clear of the ground plane edges and other cutouts. Engraving text directly.")
+				self.gnd_cutouts.extend(gdstk.boolean(box, ref.get_polygons(), "not"))
+				self.cell_refs.remove(ref)
+		
+		self.text_cell_cutouts = []
+	
+	def resolve_gnd_cutouts(self):
+		""" Subtracts all collected cutouts from the ground plane in a single boolean
+		operation, then clears the list of cutouts. Only ground plane polygons whose
+		bounding box touches a cutout go through the boolean. Engraved text cells
+		are checked first (see check_text_cell_cutouts()). """
+		
+		self.check_text_cell_cutouts()
+		
+		if len(self.gnd_cutouts) < 1:
+			return
+		
+		t_bool = time.perf_counter()
+		
+		# Find which ground polygons and cutouts have overlapping bounding boxes
+		gnd_bb = np.array([g.bounding_box() for g in self.gnd]).reshape(-1, 4)
+		cut_bb = np.array([c.bounding_box() for c in self.gnd_cutouts]).reshape(-1, 4)
+		overlap = (gnd_bb[:, None, 0] <= cut_bb[None, :, 2]) & (gnd_bb[:, None, 2] >= cut_bb[None, :, 0]) & (gnd_bb[:, None, 1] <= cut_bb[None, :, 3]) & (gnd_bb[:, None, 3] >= cut_bb[None, :, 1])
+		touched = np.any(overlap, axis=1)
+		used = np.any(overlap, axis=0)
+		
+		# Keep untouched ground polygons as they are
+		new_gnd = [g for g, t in zip(self.gnd, touched) if not t]
+		for g in new_gnd:
+			g.layer = self.layers["GND"]
+		
+		# Subtract cutouts from the rest
+		if np.any(touched):
+			new_gnd += gdstk.boolean([g for g, t in zip(self.gnd, touched) if t], [c for c, u in zip(self.gnd_cutouts, used) if u], "not", layer=self.layers["GND"])
+		
+		t_bool = time.perf_counter() - t_bool
+		debug(f"Subtracted >{np.count_nonzero(used)}< cutouts from >{np.count_nonzero(touched)}< of >{len(self.gnd)}< ground plane polygons in >{rd(t_bool*1e3, 3)} ms<.")
+		
+		self.gnd = new_gnd
+		self.gnd_cutouts = []
+	
+	def get_taper_profile(self):
+		""" Returns the precalculated taper profile (see taper_profile()) for the
+		current design. It is only recalculated when the taper settings change.
+		Returns None if the taper type is not recognized. """
+		
+		key = (self.io['taper']['type'], self.io['pads']['taper_width_um'], self.tlin['Wcenter_um'], self.io['taper']['length_um'], self.io['taper'].get('max_ripple', 0.05))
+		
+		if self.taper_cache is None or self.taper_cache[0] != key:
+			self.taper_cache = (key, taper_profile(*key))
+		
+		return self.taper_cache[1]
+	
+	def calc_taper_width(self, z):
+		""" Calculates the width of the line given the specified taper. z can be a
+		single distance along the line, or an array of distances, in which case an
+		array of widths is returned.
 		
 		Type options: (Case insensitive)
 			NONE: No taper, immediately jumps to width of spiral.
 			LINEAR: Linearly reduces width
+			EXPONENTIAL: Exponentially reduces width
+			RAISED_COSINE: Reduces width along half a cosine period
+			KLOPFENSTEIN: Log of width follows a Klopfenstein taper. The
+				passband ripple is set by io>taper>max_ripple (default 0.05).
 		
 		"""
 		
-		#TODO: Implement this!
+		profile = self.get_taper_profile()
 		
-		if self.io['taper']['type'].upper() == "NONE":
-			return self.tlin['Wcenter_um']
-		elif self.io['taper']['type'].upper() == "LINEAR":
-			slope = (self.io['pads']['taper_width_um'] - self.tlin['Wcenter_um'])/self.io['taper']['length_um']
-			if z >= self.io['taper']['length_um']:
-				return self.tlin['Wcenter_um']
-			return self.io['pads']['taper_width_um'] - slope*z
-		else:
+		if profile is None:
 			ttype = self.io['taper']['type'].upper()
 			if not self.surpress_warning_ttype:
 				warning(f"Failed to recognize taper type >{ttype}<.")
 				self.surpress_warning_ttype = True
 				
-			return self.tlin['Wcenter_um']
+			return np.full_like(z, self.tlin['Wcenter_um'], dtype=float)[()]
+		
+		return taper_widths(profile, z)
+	
+	def taper_step_widths(self, point_list, width_list, pad_y:float):
+		""" Continues the IO taper into the steps of a through line. point_list runs
+		vertically towards the bond pad, ending at y = pad_y. Each width is scaled
+		by the ratio of the taper width to the line width at that distance from the
+		pad. Points are added every taper segment length along the taper so the
+		widths follow the profile. Returns the new point and width arrays. """
+		
+		# Order from pad outwards. The steps can step back slightly, so distance
+		# from the pad is not monotonic.
+		points = np.array(point_list)[::-1]
+		widths = np.array(width_list)[::-1]
+		dist = np.abs(points[:, 1] - pad_y)
+		
+		# Find the taper sample points within each segment, not already on the line
+		dist_taper = np.arange(self.io['taper']['segment_length_um'], min(self.io['taper']['length_um'], dist.max()), self.io['taper']['segment_length_um'])
+		lo = np.searchsorted(dist_taper, np.minimum(dist[:-1], dist[1:]) + 1e-3, side='right')
+		hi = np.searchsorted(dist_taper, np.maximum(dist[:-1], dist[1:]) - 1e-3, side='left')
+		
+		# Insert samples in the order of the line, interpolating step widths along
+		# each segment
+		dist_all = [dist[:1]]
+		widths_all = [widths[:1]]
+		for i in range(len(dist)-1):
+			d = dist_taper[lo[i]:hi[i]]
+			if dist[i+1] < dist[i]:
+				d = d[::-1]
+			t = (d - dist[i])/(dist[i+1] - dist[i])
+			dist_all += [d, dist[i+1:i+2]]
+			widths_all += [widths[i] + (widths[i+1] - widths[i])*t, widths[i+1:i+2]]
+		dist_all = np.concatenate(dist_all)
+		widths = np.concatenate(widths_all)
+		
+		# Apply taper
+		widths *= self.calc_taper_width(dist_all)/self.tlin['Wcenter_um']
+		
+		direction = np.sign(points[np.argmax(dist), 1] - pad_y)
+		points = np.column_stack((np.full(len(dist_all), points[0, 0]), pad_y + direction*dist_all))
+		
+		return points[::-1], widths[::-1]
 	
 	def build_io_component(self, start_point, location_rules:dict, use_alt_side:bool=False, no_bends:bool=False):
 		""" Builds the meandered lines and bond pad for one conductor"""
@@ -1562,116 +2712,51 @@ class ChipDesign:
 		# Record how long along path you are, so know what taper width should be
 		dist = 0
 		
-		if self.use_steps: # BUild steps (TODO: can't currently taper inot steps)
-			
-			# Get current point on line - initialize w/ end of bond pad
-			current_point = [location_rules['x_pad_offset_um']-just_offset, start_point[1]]
+		if self.use_steps: # BUild steps
 			
+			# Get direction of line, where steps must stop, and end of bond pad
 			if use_alt_side:
+				direction = 1
 				pad_end_y = -self.pad_height+baseline_offset-self.through_leads_um
-				
-				# Run until break
-				running = True
-				is_first = True
-				num_steps = 0
-				while running:
-					
-					start_y = current_point[1]
-					
-					point_list.append((current_point[0], current_point[1]))
-					width_list.append(self.ZH_step_width_um)
-					
-					if is_first:
-						current_point[1] += self.step_spacing_um/2
-						is_first = False
-					else:
-						current_point[1] += self.step_spacing_um
-					
-					point_list.append((current_point[0], current_point[1]-self.steps['step_perturbation_um']))
-					width_list.append(self.ZH_step_width_um)
-					
-					point_list.append((current_point[0], current_point[1]))
-					width_list.append(self.step_width_um)
-					
-					current_point[1] += self.step_length_um
-					
-					point_list.append((current_point[0], current_point[1]-self.steps['step_perturbation_um']))
-					width_list.append(self.step_width_um)
-					
-					dist += np.abs(current_point[1] - start_y)
-					num_steps += 1
-					
-					# cp1 = current_point[1]
-					# print(f"loop A {cp1}")
-					
-					# Check for end
-					if current_point[1] >= pad_end_y:
-						running = False
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.tlin['Wcenter_um'])
-						
-						point_list.append((current_point[0], baseline_offset - self.pad_height))
-						width_list.append(self.tlin['Wcenter_um'])
-					
-						dist += np.abs((baseline_offset - self.pad_height) - current_point[1])
-						
-				info(f"Number of steps on upper half of through: {num_steps}")
-				info(f"Upper half of through, length: {dist} um")
-				
-				self.total_number_steps += num_steps
-				# self.total_line_length += dist
+				pad_y = baseline_offset - self.pad_height
+				half_name = "upper"
 			else:
-				
+				direction = -1
 				pad_end_y = self.pad_height-baseline_offset+self.through_leads_um
-				
-				# Run until break
-				running = True
-				is_first = True
-				num_steps = 0
-				while running:
-					
-					start_y = current_point[1]
-					
-					point_list.append((current_point[0], current_point[1]))
-					width_list.append(self.ZH_step_width_um)
-					
-					if is_first:
-						current_point[1] -= self.step_spacing_um/2
-						is_first = False
-					else:
-						current_point[1] -= self.step_spacing_um
-					
-					point_list.append((current_point[0], current_point[1]-self.steps['step_perturbation_um']))
-					width_list.append(self.ZH_step_width_um)
-					
-					point_list.append((current_point[0], current_point[1]))
-					width_list.append(self.step_width_um)
-					
-					current_point[1] -= self.step_length_um
-					
-					point_list.append((current_point[0], current_point[1]-self.steps['step_perturbation_um']))
-					width_list.append(self.step_width_um)
-					
-					dist += np.abs(current_point[1] - start_y)
-					num_steps += 1
-					
-					# Check for end
-					if current_point[1] <= pad_end_y:
-						running = False
-						
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.tlin['Wcenter_um'])
-						
-						point_list.append((current_point[0], -baseline_offset + self.pad_height))
-						width_list.append(self.tlin['Wcenter_um'])
-						
-						dist += np.abs((-baseline_offset + self.pad_height) - current_point[1])
-				
-				info(f"Number of steps on lower half of through: {num_steps}")
-				info(f"Lower half of through, length: {dist} um")
-				
-				self.total_number_steps += num_steps
-				# self.total_line_length += dist
+				pad_y = -baseline_offset + self.pad_height
+				half_name = "lower"
+			
+			# Get positions of section boundaries. Each period is a ZH section then a ZL
+			# section, and the first ZH section is half length. Enough periods are
+			# generated to pass pad_end_y.
+			period = self.step_spacing_um + self.step_length_um
+			num_max = max(int((pad_end_y - start_point[1])*direction/period) + 2, 1)
+			increments = np.tile([direction*self.step_spacing_um, direction*self.step_length_um], num_max)
+			increments[0] = direction*self.step_spacing_um/2
+			bounds = np.cumsum(np.concatenate(([start_point[1]], increments)))
+			
+			# Steps are added until the end of a ZL section reaches pad_end_y
+			num_steps = int(np.argmax((bounds[2::2] - pad_end_y)*direction >= 0)) + 1
+			step_starts = bounds[0:2*num_steps:2]
+			ZL_starts = bounds[1:2*num_steps:2]
+			step_ends = bounds[2:2*num_steps+1:2]
+			
+			# Tile period template: ZH start, ZH end, ZL start, ZL end. Then finish at pad.
+			y_list = np.column_stack((step_starts, ZL_starts-self.steps['step_perturbation_um'], ZL_starts, step_ends-self.steps['step_perturbation_um'])).ravel()
+			y_list = np.concatenate((y_list, [step_ends[-1], pad_y]))
+			point_list = np.column_stack((np.full(len(y_list), location_rules['x_pad_offset_um']-just_offset), y_list))
+			width_list = np.concatenate((np.tile([self.ZH_step_width_um, self.ZH_step_width_um, self.step_width_um, self.step_width_um], num_steps), [self.tlin['Wcenter_um'], self.tlin['Wcenter_um']]))
+			
+			dist = np.sum(np.abs(np.diff(step_ends, prepend=start_point[1]))) + np.abs(pad_y - step_ends[-1])
+			
+			info(f"Number of steps on {half_name} half of through: {num_steps}")
+			info(f"{half_name.capitalize()} half of through, length: {dist} um")
+			
+			self.total_number_steps += num_steps
+			# self.total_line_length += dist
+			
+			if self.taper_into_steps:
+				point_list, width_list = self.taper_step_widths(point_list, width_list, pad_y)
 		else: # Build taper
 			
 			# Get current point on line - initialize w/ end of bond pad
@@ -1754,6 +2839,11 @@ class ChipDesign:
 			
 			self.temp_pads.append(pad_bb)
 		
+		# With shared cells, the pad and faux CPW taper are placed from the pad cell, so
+		# the line starts at the end of the taper
+		if self.use_shared_cells:
+			io_line = gdstk.FlexPath((location_rules['x_pad_offset_um']-just_offset, last_height), self.io['pads']['taper_width_um'], layer=self.layers["NbTiN"])
+		
 		# Add points and widths to curve
 		for w,pt in zip(reversed(width_list), reversed(point_list)): # width_list):
 				
@@ -1786,11 +2876,6 @@ class ChipDesign:
 		baseline_offset = self.chip_size_um[1]//2 # Offset to translate (y = 0) to actual bottom of chip
 		just_offset = self.chip_size_um[0]//2 # Offset to translate (x = 0) to actual left side of chip
 		
-		# Constants defining states for state machine
-		SEC_VERT_PAD = 0
-		SEC_HORIZ = 1
-		SEC_VERT_SPIRAL = 2
-		
 		# Error checking
 		if self.io['curve_radius_um'] > location_rules['y_line_offset_um']:
 			error("Failed to create IO component.")
@@ -1807,240 +2892,53 @@ class ChipDesign:
 			y_bend_pad_trigger = line_height - self.io['curve_radius_um'] - baseline_offset
 			x_bend_spiral_trigger = start_point[0] + self.io['curve_radius_um']
 			
+		# Get bend templates
+		r_bend = self.io['curve_radius_um']
+		quarter_1 = arc_template("QUARTER_1", r_bend, self.io['num_points_bend'])
+		quarter_3 = arc_template("QUARTER_3", r_bend, self.io['num_points_bend'])
+		
 		# Pre-calculate bend coordinates - Pad side
 		if not use_alt_side:
-			theta_bp = np.linspace(0, PI/2, self.io['num_points_bend'])
-			Xbp = self.io['curve_radius_um']*np.cos(theta_bp)
-			Ybp = self.io['curve_radius_um']*np.sin(theta_bp)
-			bend_pad = [[x_-just_offset+location_rules['x_pad_offset_um']-self.io['curve_radius_um'], y_-baseline_offset+line_height-self.io['curve_radius_um']] for x_, y_ in zip(Xbp, Ybp)] # List of points for pad side bend
+			bend_pad = (quarter_1 + [location_rules['x_pad_offset_um']-just_offset-r_bend, line_height-baseline_offset-r_bend]) # Points for pad side bend
 		else:
-			theta_bp = np.linspace(0, PI/2, self.io['num_points_bend'])
-			Xbp = self.io['curve_radius_um']*np.cos(theta_bp)
-			Ybp = self.io['curve_radius_um']*np.sin(theta_bp)
-			bend_pad = [[-x_-just_offset+location_rules['x_pad_offset_um']+self.io['curve_radius_um'], -y_+baseline_offset-line_height+self.io['curve_radius_um']] for x_, y_ in zip(Xbp, Ybp)] # List of points for pad side bend
+			bend_pad = (-1*quarter_1 + [location_rules['x_pad_offset_um']-just_offset+r_bend, baseline_offset-line_height+r_bend]) # Points for pad side bend
 		
+		# Pre-calculate bend coordinates - Spiral side
 		if not use_alt_side:
-			# Pre-calculate bend coordinates - Spiral side
-			theta_bp = np.linspace(PI, 3*PI/2, self.io['num_points_bend'])
-			Xbp = self.io['curve_radius_um']*np.cos(theta_bp)
-			Ybp = self.io['curve_radius_um']*np.sin(theta_bp)
-			bend_spiral = [[x_+start_point[0]+self.io['curve_radius_um'], y_-baseline_offset+line_height+self.io['curve_radius_um']] for x_, y_ in zip(Xbp, Ybp)]
-			bend_spiral.reverse() # List of points for spiral side bend
+			bend_spiral = (quarter_3 + [start_point[0]+r_bend, line_height-baseline_offset+r_bend])[::-1] # Points for spiral side bend
 		else:
-			# Pre-calculate bend coordinates - Spiral side
-			theta_bp = np.linspace(PI, 3*PI/2, self.io['num_points_bend'])
-			Xbp = self.io['curve_radius_um']*np.cos(theta_bp)
-			Ybp = self.io['curve_radius_um']*np.sin(theta_bp)
-			bend_spiral = [[-x_+start_point[0]-self.io['curve_radius_um'], -y_+baseline_offset-line_height-self.io['curve_radius_um']] for x_, y_ in zip(Xbp, Ybp)]
-			bend_spiral.reverse() # List of points for spiral side bend
+			bend_spiral = (-1*quarter_3 + [start_point[0]-r_bend, baseline_offset-line_height-r_bend])[::-1] # Points for spiral side bend
 		
 		# Get current point on line - initialize w/ end of bond pad
 		if not use_alt_side:
-			current_point = [location_rules['x_pad_offset_um']-just_offset, self.pad_height-baseline_offset]
+			pad_point = [location_rules['x_pad_offset_um']-just_offset, self.pad_height-baseline_offset]
+			direction = 1
 		else:
-			current_point = [location_rules['x_pad_offset_um']-just_offset, -self.pad_height+baseline_offset]
+			pad_point = [location_rules['x_pad_offset_um']-just_offset, -self.pad_height+baseline_offset]
+			direction = -1
 		
-		# Create list of points and widths
-		point_list = []
-		width_list = []
+		# Vertical run away from pad, stopping short of the pad side bend
+		seg_len = self.io['taper']['segment_length_um']
+		run_y = straight_run(pad_point[1], direction*seg_len, y_bend_pad_trigger)
+		vert_pad = np.column_stack((np.full(len(run_y), pad_point[0]), run_y))
 		
-		# Record which section of line algorithm is on
-		section = SEC_VERT_PAD
+		# Horizontal run towards spiral, stopping short of the spiral side bend
+		run_x = straight_run(bend_pad[-1][0], -direction*seg_len, x_bend_spiral_trigger)
+		horiz = np.column_stack((run_x, np.full(len(run_x), bend_pad[-1][1])))
 		
-		# Record how long along path you are, so know what taper width should be
-		dist = 0 
+		# Vertical run towards spiral, stopping short of the spiral start point
+		run_y = straight_run(bend_spiral[-1][1], direction*seg_len, start_point[1])
+		vert_spiral = np.column_stack((np.full(len(run_y), bend_spiral[-1][0]), run_y))
 		
-		if not use_alt_side:
-			# Run until break
-			while True:
-				
-				# 
-				if section == SEC_VERT_PAD:
-					
-					# Check when need to add first bend
-					if current_point[1]+self.io['taper']['segment_length_um'] >= y_bend_pad_trigger:
-						
-						debug("Triggering first bend")
-						
-						# Loop over each point in bend, add all
-						for bp in bend_pad:
-							
-							# Calculate distance to new point
-							dX = np.sqrt((bp[0] - current_point[0])**2 + (bp[1] - current_point[1])**2)
-							
-							# Update positon
-							current_point = bp
-							dist += dX
-							
-							# Add to lists
-							point_list.append((current_point[0], current_point[1]))
-							width_list.append(self.calc_taper_width(dist))
-							
-						section = SEC_HORIZ
-					else:
-						
-						# Update position
-						current_point[1] += self.io['taper']['segment_length_um']
-						dist += self.io['taper']['segment_length_um']
-						
-						# Add to lists
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.calc_taper_width(dist))
-						
-						# debug(f"Moving position to >{current_point}< at width >{self.calc_taper_width(dist)}< um.")
-				
-				elif section == SEC_HORIZ:
-					
-					# Check when need to add first bend
-					if current_point[0]-self.io['taper']['segment_length_um'] <= x_bend_spiral_trigger:
-						
-						# Loop over each point in bend, add all
-						for bp in bend_spiral:
-							
-							# Calculate distance to new point
-							dX = np.sqrt((bp[0] - current_point[0])**2 + (bp[1] - current_point[1])**2)
-							
-							# Update positon
-							current_point = bp
-							dist += dX
-							
-							# Add to lists
-							point_list.append((current_point[0], current_point[1]))
-							width_list.append(self.calc_taper_width(dist))
-						
-						section = SEC_VERT_SPIRAL
-					else:
-						# Update position
-						current_point[0] -= self.io['taper']['segment_length_um']
-						dist += self.io['taper']['segment_length_um']
-						
-						# Add to lists
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.calc_taper_width(dist))
-				
-				if section == SEC_VERT_SPIRAL:
-					
-					# Check when need to add first bend
-					if current_point[1]+self.io['taper']['segment_length_um'] >= start_point[1]:
-						
-						# Loop over each point in bend, add all
-						for bp in bend_pad:
-							
-							# Calculate distance to new point
-							dX = np.sqrt((start_point[0] - current_point[0])**2 + (start_point[1] - current_point[1])**2)
-							
-							# Update positon
-							current_point = start_point
-							dist += dX
-							
-							# Add to lists
-							point_list.append((current_point[0], current_point[1]))
-							width_list.append(self.tlin['Wcenter_um'])
-						
-						break
-					else:
-						# Update position
-						current_point[1] += self.io['taper']['segment_length_um']
-						dist += self.io['taper']['segment_length_um']
-						
-						# Add to lists
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.calc_taper_width(dist))
-		else:
-			
-			# Run until break
-			while True:
-				
-				# 
-				if section == SEC_VERT_PAD:
-					
-					# Check when need to add first bend
-					if current_point[1]-self.io['taper']['segment_length_um'] <= y_bend_pad_trigger:
-						
-						debug("Triggering first bend")
-						
-						# Loop over each point in bend, add all
-						for bp in bend_pad:
-							
-							# Calculate distance to new point
-							dX = np.sqrt((bp[0] - current_point[0])**2 + (bp[1] - current_point[1])**2)
-							
-							# Update positon
-							current_point = bp
-							dist += dX
-							
-							# Add to lists
-							point_list.append((current_point[0], current_point[1]))
-							width_list.append(self.calc_taper_width(dist))
-							
-						section = SEC_HORIZ
-					else:
-						
-						# Update position
-						current_point[1] -= self.io['taper']['segment_length_um']
-						dist += self.io['taper']['segment_length_um']
-						
-						# Add to lists
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.calc_taper_width(dist))
-						
-				elif section == SEC_HORIZ:
-					
-					# Check when need to add first bend
-					if current_point[0]+self.io['taper']['segment_length_um'] >= x_bend_spiral_trigger:
-						
-						# Loop over each point in bend, add all
-						for bp in bend_spiral:
-							
-							# Calculate distance to new point
-							dX = np.sqrt((bp[0] - current_point[0])**2 + (bp[1] - current_point[1])**2)
-							
-							# Update positon
-							current_point = bp
-							dist += dX
-							
-							# Add to lists
-							point_list.append((current_point[0], current_point[1]))
-							width_list.append(self.calc_taper_width(dist))
-						
-						section = SEC_VERT_SPIRAL
-					else:
-						# Update position
-						current_point[0] += self.io['taper']['segment_length_um']
-						dist += self.io['taper']['segment_length_um']
-						
-						# Add to lists
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.calc_taper_width(dist))
-				
-				if section == SEC_VERT_SPIRAL:
-					
-					# Check when need to add first bend
-					if current_point[1]-self.io['taper']['segment_length_um'] <= start_point[1]:
-						
-						# Loop over each point in bend, add all
-						for bp in bend_pad:
-							
-							# Calculate distance to new point
-							dX = np.sqrt((start_point[0] - current_point[0])**2 + (start_point[1] - current_point[1])**2)
-							
-							# Update positon
-							current_point = start_point
-							dist += dX
-							
-							# Add to lists
-							point_list.append((current_point[0], current_point[1]))
-							width_list.append(self.tlin['Wcenter_um'])
-						
-						break
-					else:
-						# Update position
-						current_point[1] -= self.io['taper']['segment_length_um']
-						dist += self.io['taper']['segment_length_um']
-						
-						# Add to lists
-						point_list.append((current_point[0], current_point[1]))
-						width_list.append(self.calc_taper_width(dist))
+		# Assemble whole line, ending on the spiral start point
+		point_list = np.concatenate(([pad_point], vert_pad, bend_pad, horiz, bend_spiral, vert_spiral, [start_point]))
+		
+		# Get distance along path to each point, and the width at that distance
+		dist_list = np.cumsum(np.hypot(np.diff(point_list[:, 0]), np.diff(point_list[:, 1])))
+		dist = dist_list[-1]
+		width_list = self.calc_taper_width(dist_list)
+		width_list[-1] = self.tlin['Wcenter_um']
+		point_list = point_list[1:]
 		
 		# Initialize IO structure with bond pad
 		if not use_alt_side:
@@ -2077,13 +2975,21 @@ class ChipDesign:
 			
 			self.temp_pads.append(pad_bb)
 		
-		# Add points and widths to curve
-		for idx,pt in enumerate(point_list): # width_list):
-			
-			w = width_list[idx]
-			
+		# With shared cells, the pad and faux CPW taper are placed from the pad cell, so
+		# the line starts at the end of the taper
+		if self.use_shared_cells:
+			io_line = gdstk.FlexPath((location_rules['x_pad_offset_um']-just_offset, last_height), self.io['pads']['taper_width_um'], layer=self.layers["NbTiN"])
+		
+		# Add tapered points one at a time, so each can have its own width
+		idx_changes = np.flatnonzero(width_list != width_list[-1])
+		idx_const = idx_changes[-1]+1 if len(idx_changes) > 0 else 0
+		for pt, w in zip(point_list[:idx_const+1], width_list[:idx_const+1]):
 			io_line.segment(pt, w)
 		
+		# Add remaining constant width points in one call
+		if idx_const+1 < len(point_list):
+			io_line.segment(point_list[idx_const+1:], width_list[-1])
+		
 		self.io_line_list.append(io_line)
 		
 		taper_length = self.io['taper']['length_um']
@@ -2094,7 +3000,40 @@ class ChipDesign:
 			warning("Meandered line length is less than taper length! Sharp edge present.")
 	
 	def insert_text(self, position:list, text:str, font_path:str=None, font_size_um:float=100, tolerance=0.1, layer=None, center_justify:bool=False, right_justify:bool=False):
-		''' Inserts custom text to the chip. Can use any TrueType font (rather than just the default supplied with gdstk). '''
+		''' Inserts custom text to the chip. Can use any TrueType font (rather than just the default supplied with gdstk),
+		given by its file path or by a name added with register_font().
+		
+		Returns the bounding box of the placed text as ((x_min, y_min), (x_max, y_max)),
+		so that further lines can be positioned relative to it. Returns False on failure. '''
+		
+		if center_justify:
+			justify = "CENTER"
+		elif right_justify:
+			justify = "RIGHT"
+		else:
+			justify = "LEFT"
+		
+		return self.insert_text_block([text], position, font_path=font_path, font_size_um=font_size_um, justify=justify, tolerance=tolerance, layer=layer)
+	
+	def insert_text_block(self, lines:list, position:list, font_path:str=None, font_size_um:float=100, line_gap_um:float=35, justify:str="LEFT", tolerance=0.1, layer=None):
+		''' Inserts a block of text lines to the chip. position is the start of the
+		first line's baseline, and each following line is placed font_size_um +
+		line_gap_um lower. justify (LEFT, CENTER or RIGHT) aligns every line to
+		position's X-coordinate. The font is given as in insert_text().
+		
+		If use_text_cells is true, each line is placed as a reference to a shared
+		text cell (see place_text_cells()). Text engraved into the ground plane this
+		way must lie at least text_cell_margin_um clear of the ground plane edges
+		and other cutouts. Lines which do not are engraved directly instead (see
+		resolve_gnd_cutouts()).
+		
+		Returns the bounding box of the whole block as ((x_min, y_min), (x_max, y_max)).
+		Returns False on failure. '''
+		
+		justify = justify.upper()
+		if justify not in ["LEFT", "CENTER", "RIGHT"]:
+			error(f"Unrecognized text justification '>{justify}<'.")
+			return False
 		
 		if self.graphics_on_gnd:
 			
@@ -2103,116 +3042,126 @@ class ChipDesign:
 				error("Failed to find ground plane. Cannot add graphic to ground plane.")
 				return False
 			
-			# Get text objects
-			text_obj = render_text(text, size=font_size_um, font_path=font_path, position=position, tolerance=tolerance, layer=self.layers['NbTiN'])
+			layer = self.layers['NbTiN']
+		
+		# Get default layer
+		elif layer is None:
+			layer = self.layers['NbTiN']
+		
+		if self.use_text_cells:
+			return self.place_text_cells(lines, position, font_path, font_size_um, line_gap_um, justify, tolerance, layer)
+		
+		# Render each line once, then justify by shifting the rendered line
+		text_obj = []
+		for idx, line in enumerate(lines):
 			
-			# Center Justify
-			if center_justify:
-				
-				# Get bounding box
-				min_x, max_x = None, None
-				for to in text_obj:
-					
-					bb = to.bounding_box()
-					
-					if min_x is None or bb[0][0] < min_x:
-						min_x = bb[0][0]
-					
-					if max_x is None or bb[1][0] > max_x:
-						max_x = bb[1][0]
-				
-				# update position
-				text_width = max_x - min_x
-				position = (position[0] - text_width/2, position[1])
-				
-				# Re-render text
-				text_obj = render_text(text, size=font_size_um, font_path=font_path, position=position, tolerance=tolerance, layer=self.layers['NbTiN'])
+			baseline = position[1] - idx*(font_size_um + line_gap_um)
+			line_obj = render_text(line, size=font_size_um, font_path=font_path, position=(position[0], baseline), tolerance=tolerance, layer=layer)
 			
-			elif right_justify:
-				
-				# Get bounding box
-				min_x, max_x = None, None
-				for to in text_obj:
-					
-					bb = to.bounding_box()
-					
-					if min_x is None or bb[0][0] < min_x:
-						min_x = bb[0][0]
-					
-					if max_x is None or bb[1][0] > max_x:
-						max_x = bb[1][0]
+			if justify != "LEFT" and len(line_obj) > 0:
 				
-				# update position
-				text_width = max_x - min_x
-				position = (position[0] - text_width, position[1])
+				bb = polygons_bounding_box(line_obj)
+				text_width = bb[1][0] - bb[0][0]
+				if justify == "CENTER":
+					dx = -text_width/2
+				else:
+					dx = -text_width
 				
-				# Re-render text
-				text_obj = render_text(text, size=font_size_um, font_path=font_path, position=position, tolerance=tolerance, layer=self.layers['NbTiN'])
+				for to in line_obj:
+					to.translate(dx, 0)
+			
+			text_obj.extend(line_obj)
+		
+		bb = polygons_bounding_box(text_obj, position)
+		
+		if self.graphics_on_gnd:
 			
-			# Subtract text from ground
-			for to in text_obj:
-				self.gnd = gdstk.boolean(self.gnd, text_obj, "not", layer=self.layers["GND"])
+			# Queue text for subtraction from ground
+			self.gnd_cutouts.extend(text_obj)
 			
 		else:
+			
+			# Write to design
+			self.text_obj_list.extend(text_obj)
+		
+		return bb
+	
+	def place_text_cells(self, lines:list, position:list, font_path, font_size_um:float, line_gap_um:float, justify:str, tolerance:float, layer:int):
+		''' Places each line of a text block (see insert_text_block()) as a reference
+		to a shared text cell (see text_cell()). Text on the ground plane is
+		engraved by queueing the padded bounding box of each line with its
+		reference, and placing a cell holding the padded box minus the text (see
+		resolve_gnd_cutouts()). Returns the bounding box of the block. '''
+		
+		# Engraved text cells fill in the ground plane around the text
+		if self.graphics_on_gnd:
+			layer = self.layers['GND']
 		
-			# Get default layer
-			if layer is None:
-				layer = self.layers['NbTiN']
+		bl = []
+		tr = []
+		for idx, line in enumerate(lines):
 			
-			# Get text objects
-			text_obj = render_text(text, size=font_size_um, font_path=font_path, position=position, tolerance=tolerance, layer=layer)
+			cell, bb = text_cell(line, font_size_um, font_path, tolerance, layer, engrave=self.graphics_on_gnd)
+			if cell is None:
+				continue
 			
-			# Write to design
-			for to in text_obj:
-				self.text_object_list.append(to)
+			# Justify by moving the reference
+			text_width = bb[1][0] - bb[0][0]
+			if justify == "CENTER":
+				dx = -text_width/2
+			elif justify == "RIGHT":
+				dx = -text_width
+			else:
+				dx = 0
+			
+			origin = (position[0] + dx, position[1] - idx*(font_size_um + line_gap_um))
+			ref = gdstk.Reference(cell, origin)
+			self.cell_refs.append(ref)
+			
+			box_bl = (origin[0] + bb[0][0], origin[1] + bb[0][1])
+			box_tr = (origin[0] + bb[1][0], origin[1] + bb[1][1])
+			if self.graphics_on_gnd:
+				self.text_cell_cutouts.append((text_cell_cutout(bb, origin), ref))
+			
+			bl.append(box_bl)
+			tr.append(box_tr)
+		
+		if len(bl) < 1:
+			return ((position[0], position[1]), (position[0], position[1]))
+		
+		return ((min(b[0] for b in bl), min(b[1] for b in bl)), (max(t[0] for t in tr), max(t[1] for t in tr)))
 	
 	def insert_graphic(self, position:list, gds_filename:str, width_um:float=-1, read_layer:int=1, read_datatype:int=0, write_layer:int=None, write_datatype:int=None):
 		''' Accepts a GDS file and applies the graphic to the chip. '''
 		
-		read_filt = {(read_layer, read_datatype)}
-			
 		# Get default layer/datatype
 		if write_layer is None:
 			write_layer = self.layers['NbTiN']
 		if write_datatype is None:
 			write_datatype = 0
 		
-		# Read GDS File
+		# Read GDS File (or reuse cached copy)
 		try:
-			lib_in = gdstk.read_gds(gds_filename, filter=read_filt)
-		except:
-			error(f"Failed to read file '>{gds_filename}<'.")
+			graphic_polys, bb = read_graphic(gds_filename, read_layer, read_datatype)
+		except Exception as e:
+			error(f"Failed to read file '>{gds_filename}<' ({e}).")
 			return False
 		
-		# Access top level cell
-		cell_in = lib_in.top_level()
-		
-		# Access polygons
-		all_polys = cell_in[0].polygons
+		if len(graphic_polys) < 1:
+			error(f"No polygons found on layer >{read_layer}<, datatype >{read_datatype}< of '>{gds_filename}<'.")
+			return False
 		
-		# Get all bounding boxes
-		all_bb = []
-		for poly in all_polys:
-			# Check current size and scale appropriately
-			bb = poly.bounding_box()
-			all_bb.append([[bb[0][0], bb[0][1]], [bb[1][0], bb[1][1]]])
-		
-		# Get master bounding box
-		bb = all_bb[0]
-		for bb_ in all_bb:
-			bb[0][0] = min(bb[0][0], bb_[0][0])
-			bb[0][1] = min(bb[0][1], bb_[0][1])
-			bb[1][0] = max(bb[1][0], bb_[1][0])
-			bb[1][1] = max(bb[1][1], bb_[1][1])
+		# Scale
+		all_polys = [poly.copy() for poly in graphic_polys]
+		if width_um > 0:
+			scale = width_um/(bb[1][0]-bb[0][0])
+			info(f"Scaling graphic to width=>{width_um} um<.")
 		
 		# Scan over all polygons
 		for poly in all_polys:
 			
-			# Scale
 			if width_um > 0:
-				width = bb[1][0]-bb[0][0]
-				poly.scale(width_um/width)
-				info(f"Scaling graphic to width=>{width_um} um<.")
+				poly.scale(scale)
 			
 			# Move to requested position
 			poly.translate(position[0]-bb[0][0], position[1]-bb[0][1])
@@ -2224,9 +3173,8 @@ class ChipDesign:
 				error("Failed to find ground plane. Cannot add graphic to ground plane.")
 				return False
 			
-			# Subtract text from ground
-			for poly in all_polys:
-				self.gnd = gdstk.boolean(self.gnd, poly, "not", layer=self.layers["GND"])
+			# Queue graphic for subtraction from ground
+			self.gnd_cutouts.extend(all_polys)
 				
 		else:
 			
@@ -2249,6 +3197,7 @@ class ChipDesign:
 		if DUMMY_MODE:
 			info(f"Skipping write GDS file >DUMMY_MODE<=>TRUE<.")
 		else:
+			add_dependencies(self.lib, self.main_cell)
 			self.lib.write_gds(filename)
 			info(f"Wrote GDS file {MPrC}'{filename}'{StdC}")
 		
@@ -0,0 +1,98 @@
+import sys
+import numpy as np
+import gdstk
+from spiralator.core import clip_to_box
+
+# Checks clip_to_box() against clipping every polygon with gdstk.boolean. Random
+# rectangles, rotated rectangles, circles and keyhole polygons are placed wholly
+# inside, wholly outside, across and touching the edges of the box. The clipped
+# area and the layer and datatype of the output should match. gdstk.boolean
+# links the holes of rings through rounded points, so the areas may differ by
+# up to a grid step along the outline.
+
+box_bl = (-500, -250)
+box_tr = (500, 250)
+
+num_trials = 200
+shapes_per_trial = 20
+
+def random_shape(rng):
+	''' Returns a random polygon around the box, with its points on the 1 nm grid
+	gdstk.boolean snaps to. '''
+	
+	poly = random_outline(rng)
+	
+	return gdstk.Polygon(np.round(poly.points, 3), layer=poly.layer)
+
+def random_outline(rng):
+	''' Returns a random rectangle, rotated rectangle, circle, ring or triangle
+	around the box. '''
+	
+	cx, cy = np.round(rng.uniform(-800, 800), 3), np.round(rng.uniform(-500, 500), 3)
+	w, h = np.round(rng.uniform(1, 400, size=2), 3)
+	kind = rng.integers(5)
+	
+	# Snap some shapes so they touch an edge of the box
+	if rng.random() < 0.2:
+		edge = rng.integers(4)
+		if edge == 0:
+			cx = box_bl[0] - w/2
+		elif edge == 1:
+			cx = box_tr[0] + w/2
+		elif edge == 2:
+			cy = box_bl[1] - h/2
+		else:
+			cy = box_tr[1] - h/2
+	
+	if kind == 0:
+		return gdstk.rectangle((cx - w/2, cy - h/2), (cx + w/2, cy + h/2), layer=3)
+	elif kind == 1:
+		poly = gdstk.rectangle((cx - w/2, cy - h/2), (cx + w/2, cy + h/2), layer=3)
+		poly.rotate(rng.uniform(0, np.pi), (cx, cy))
+		return poly
+	elif kind == 2:
+		return gdstk.ellipse((cx, cy), w/2, tolerance=0.1, layer=3)
+	elif kind == 3:
+		return gdstk.ellipse((cx, cy), w/2, inner_radius=w/4, tolerance=0.1, layer=3)
+	else:
+		return gdstk.regular_polygon((cx, cy), w/2, 3, rotation=rng.uniform(0, np.pi), layer=3)
+
+def area_difference(polys_a:list, polys_b:list):
+	''' Returns the area covered by only one of two lists of polygons. '''
+	
+	return sum(p.area() for p in gdstk.boolean(polys_a, polys_b, "not")) + sum(p.area() for p in gdstk.boolean(polys_b, polys_a, "not"))
+
+def perimeter(polys:list):
+	''' Returns the total perimeter of a list of polygons. '''
+	
+	return sum(np.sum(np.linalg.norm(np.diff(p.points, axis=0, append=p.points[:1]), axis=1)) for p in polys)
+
+if __name__ == "__main__":
+	
+	rng = np.random.default_rng(0)
+	box = gdstk.rectangle(box_bl, box_tr)
+	
+	num_fail = 0
+	max_diff = 0
+	for trial in range(num_trials):
+		
+		polys = [random_shape(rng) for _ in range(shapes_per_trial)]
+		
+		clipped = clip_to_box(polys, box_bl, box_tr, layer=5, datatype=2)
+		reference = gdstk.boolean(polys, box, "and", layer=5, datatype=2)
+		
+		diff = area_difference(clipped, reference)/perimeter(reference)
+		max_diff = max(max_diff, diff)
+		same_layer = all(p.layer == 5 and p.datatype == 2 for p in clipped)
+		no_slivers = all(p.area() > 0 for p in clipped)
+		
+		if diff > 1e-3 or not same_layer or not no_slivers:
+			num_fail += 1
+			print(f"Trial {trial}: area difference per outline length {diff:.3e} um, layers {'ok' if same_layer else 'WRONG'}, {'no empty polygons' if no_slivers else 'EMPTY POLYGONS'}")
+	
+	print(f"{num_trials} trials of {shapes_per_trial} shapes, largest area difference per outline length {max_diff:.3e} um.")
+	if num_fail > 0:
+		print(f"clip_to_box() differs from gdstk.boolean in {num_fail} trials!")
+		sys.exit(1)
+	
+	print("clip_to_box() agrees with gdstk.boolean in all trials.")
@@ -0,0 +1,94 @@
+import os
+import sys
+import glob
+import json
+import logging
+from spiralator.core import ChipDesign
+
+# Checks ChipDesign.check_fit() against build_standard() on every shipped
+# design, both with evenly spaced spiral points and with adaptive sampling.
+# check_fit() only evaluates the samples next to the spiral's tangents, so the
+# bounds it passes to calc_y_fit() and calc_x_fit() should be identical to
+# those of the fully sampled spiral, and it should accept exactly the designs
+# that build_standard() accepts. Each design is also checked with twice as
+# many rotations, which should not fit.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+chord_errors = [None, 0.1]
+rotation_scales = [1, 2]
+
+def is_spiral_design(conf:str):
+	''' Returns true if conf is a chip design file with a spiral. '''
+
+	try:
+		with open(conf) as f:
+			data = json.load(f)
+	except Exception:
+		return False
+
+	return isinstance(data, dict) and 'faux_cpw_taper' in data.get('io', {}) and data.get('spiral', {}).get('num_rotations', 0) != 0
+
+def record_bounds(chip:ChipDesign):
+	''' Wraps calc_y_fit() and calc_x_fit() on chip to record the bounds they
+	are called with. Returns the dictionary the bounds are written to. '''
+
+	calls = {}
+	calc_y_fit = chip.calc_y_fit
+	calc_x_fit = chip.calc_x_fit
+
+	def y_fit(y_min, y_max):
+		calls['y'] = (y_min, y_max)
+		return calc_y_fit(y_min, y_max)
+
+	def x_fit(x_min, x_max):
+		calls['x'] = (x_min, x_max)
+		return calc_x_fit(x_min, x_max)
+
+	chip.calc_y_fit = y_fit
+	chip.calc_x_fit = x_fit
+
+	return calls
+
+if __name__ == "__main__":
+
+	logging.getLogger().setLevel(logging.CRITICAL)
+
+	confs = [c for c in sorted(glob.glob(os.path.join(REPO_PATH, "**", "*.json"), recursive=True)) if is_spiral_design(c)]
+
+	print(f"{'design':>40} {'rotations':>10} {'chord (um)':>10} {'check_fit':>10} {'build':>7} {'bounds':>8}")
+
+	num_mismatch = 0
+	for conf in confs:
+
+		for chord_error, rotation_scale in [(c, r) for r in rotation_scales for c in chord_errors]:
+
+			chip = ChipDesign()
+			chip.read_conf(conf)
+			chip.spiral['num_rotations'] *= rotation_scale
+			if chord_error is not None:
+				chip.spiral['max_chord_error_um'] = chord_error
+
+			calls = record_bounds(chip)
+			fit = chip.check_fit()
+			fit_calls = dict(calls)
+			calls.clear()
+
+			# Only the spiral placement is of interest, so stop at later build errors
+			try:
+				built = chip.build_standard() is not False
+			except Exception:
+				built = 'y' in calls and 'x' in calls
+
+			# X placement is not checked if the Y check fails
+			same_bounds = fit_calls['y'] == calls['y'] and fit_calls['x'] == calls.get('x', fit_calls['x'])
+			if fit['fits'] != built or not same_bounds:
+				num_mismatch += 1
+
+			print(f"{os.path.basename(conf)[:40]:>40} {chip.spiral['num_rotations']:>10} {str(chord_error):>10} {str(fit['fits']):>10} {str(built):>7} {'same' if same_bounds else 'DIFFER':>8}")
+
+	if num_mismatch > 0:
+		print(f"Mismatch between check_fit() and build_standard() for {num_mismatch} designs!")
+		sys.exit(1)
+	
+	print("check_fit() agrees with build_standard() for all designs.")
@@ -0,0 +1,118 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import gdstk
+import numpy as np
+from spiralator import core
+from spiralator.core import ChipDesign, read_graphic
+
+# Checks the GDS graphic cache used by ChipDesign.insert_graphic(). A graphic is
+# placed on several designs, which should read the file once and give the same
+# polygons as reading it directly. The cached polygons must not be changed by
+# placing them. Replacing the file (with a new modification time) should cause
+# it to be read again, and other layers of the same file are cached separately.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+graphic = os.path.join(REPO_PATH, "scirpts", "assets", "graphics", "CU.gds")
+replacement = os.path.join(REPO_PATH, "tests", "read_test.gds")
+
+num_designs = 5
+
+def stats():
+	''' Returns the current cache hits and misses. '''
+	
+	return core.graphic_cache_stats["hits"], core.graphic_cache_stats["misses"]
+
+def direct_polygons(gds_filename:str, read_layer:int=1, read_datatype:int=0):
+	''' Reads the polygons of a graphic without the cache. '''
+	
+	return gdstk.read_gds(gds_filename, filter={(read_layer, read_datatype)}).top_level()[0].polygons
+
+def place_uncached(gds_filename:str, width_um:float=350):
+	''' Places the graphic as insert_graphic() did before the cache. Returns the
+	placed polygons. '''
+	
+	polys = direct_polygons(gds_filename)
+	bb = gdstk.read_gds(gds_filename, filter={(1, 0)}).top_level()[0].bounding_box()
+	for poly in polys:
+		poly.scale(width_um/(bb[1][0] - bb[0][0]))
+		poly.translate(920 - bb[0][0], 4125 - bb[0][1])
+	
+	return polys
+
+def place(gds_filename:str, width_um:float=350):
+	''' Places the graphic on a new design. Returns the placed polygons. '''
+	
+	chip = ChipDesign()
+	chip.insert_graphic((920, 4125), gds_filename, width_um)
+	
+	return chip.main_cell.polygons
+
+def same_polygons(polys_a:list, polys_b:list):
+	''' Returns true if both lists hold the same points in the same order. '''
+	
+	return len(polys_a) == len(polys_b) and all(np.array_equal(a.points, b.points) for a, b in zip(polys_a, polys_b))
+
+if __name__ == "__main__":
+	
+	logging.getLogger().setLevel(logging.CRITICAL)
+	
+	checks = {}
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		
+		gds_file = os.path.join(tmp_dir, "graphic.gds")
+		shutil.copy(graphic, gds_file)
+		
+		# Place on several designs, reading the file once
+		hits, misses = stats()
+		placed = [place(gds_file) for _ in range(num_designs)]
+		checks['read once'] = stats() == (hits + num_designs - 1, misses + 1)
+		checks['same placement'] = all(same_polygons(placed[0], p) for p in placed[1:])
+		checks['as uncached'] = same_polygons(placed[0], place_uncached(gds_file))
+		
+		# Cached polygons match the file and are unchanged by placing them
+		cached, bb = read_graphic(gds_file)
+		checks['matches file'] = same_polygons(cached, direct_polygons(gds_file))
+		checks['bounding box'] = np.allclose(bb, gdstk.read_gds(gds_file).top_level()[0].bounding_box())
+		
+		# Other layers are cached separately
+		hits, misses = stats()
+		read_graphic(gds_file, read_layer=2)
+		read_graphic(gds_file, read_layer=2)
+		checks['layers'] = stats() == (hits + 1, misses + 1)
+		
+		# Replace the file, with a later modification time
+		mtime = os.stat(gds_file).st_mtime_ns
+		shutil.copy(replacement, gds_file)
+		os.utime(gds_file, ns=(mtime + 10**9, mtime + 10**9))
+		
+		hits, misses = stats()
+		replaced = place(gds_file)
+		place(gds_file)
+		checks['reread'] = stats() == (hits + 1, misses + 1)
+		checks['new graphic'] = same_polygons(read_graphic(gds_file)[0], direct_polygons(gds_file)) and not same_polygons(replaced, placed[0])
+		
+		# An earlier modification time also counts as a change
+		os.utime(gds_file, ns=(mtime, mtime))
+		hits, misses = stats()
+		read_graphic(gds_file)
+		checks['older file'] = stats() == (hits, misses + 1)
+		
+		# Missing files fail as before
+		os.remove(gds_file)
+		checks['missing file'] = ChipDesign().insert_graphic((0, 0), gds_file) is False
+	
+	for name, passed in checks.items():
+		print(f"{name:>16} {'ok' if passed else 'FAILED'}")
+	
+	print(f"Cache: {core.graphic_cache_stats['hits']} hits, {core.graphic_cache_stats['misses']} misses.")
+	
+	num_fail = sum(1 for passed in checks.values() if not passed)
+	if num_fail > 0:
+		print(f"{num_fail} graphic cache checks failed!")
+		sys.exit(1)
+	
+	print("All graphic cache checks passed.")
@@ -0,0 +1,74 @@
+import os
+import sys
+import glob
+import json
+import time
+import logging
+from spiralator.core import ChipDesign
+
+# Checks ChipDesign.calc_metrics() against a full build of every shipped design,
+# including through designs without a spiral. Designs with step settings are
+# also checked with the low impedance steps of the Series 3.1 scripts. The total
+# line length and number of steps calculated without geometry should match those
+# found by build(), the length to within tolerance_um.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+tolerance_um = 0.05
+step_options = [None, {'ZL_width_um': 4.4, 'ZH_width_um': 2.85, 'ZL_length_um': 16, 'ZH_length_um': 270}]
+
+def is_design(conf:str):
+	''' Returns true if conf is a chip design file. '''
+	
+	try:
+		with open(conf) as f:
+			data = json.load(f)
+	except Exception:
+		return False
+	
+	return isinstance(data, dict) and 'faux_cpw_taper' in data.get('io', {})
+
+if __name__ == "__main__":
+	
+	logging.getLogger().setLevel(logging.CRITICAL)
+	
+	confs = [c for c in sorted(glob.glob(os.path.join(REPO_PATH, "**", "*.json"), recursive=True)) if is_design(c)]
+	
+	print(f"{'design':>40} {'steps':>6} {'built (um)':>12} {'metrics (um)':>13} {'err (um)':>9} {'steps':>6} {'metrics':>8} {'build (ms)':>11} {'metrics (ms)':>13}")
+	
+	num_mismatch = 0
+	for conf, steps in [(c, s) for c in confs for s in step_options]:
+		
+		chip = ChipDesign()
+		chip.read_conf(conf)
+		
+		# Steps also need the step settings of the design file
+		if steps is not None:
+			if not hasattr(chip, 'steps'):
+				continue
+			chip.configure_steps(**steps)
+		
+		t0 = time.perf_counter()
+		metrics = chip.calc_metrics()
+		t_metrics = time.perf_counter() - t0
+		
+		# Skip older designs which no longer build
+		t0 = time.perf_counter()
+		try:
+			chip.build()
+		except Exception as e:
+			print(f"{os.path.basename(conf)[:40]:>40} {str(chip.use_steps):>6} skipped, failed to build ({e})")
+			continue
+		t_build = time.perf_counter() - t0
+		
+		err = metrics['total_line_length_um'] - chip.total_line_length
+		if abs(err) > tolerance_um or metrics['num_steps'] != chip.total_number_steps:
+			num_mismatch += 1
+		
+		print(f"{os.path.basename(conf)[:40]:>40} {str(chip.use_steps):>6} {chip.total_line_length:>12.2f} {metrics['total_line_length_um']:>13.2f} {err:>9.4f} {chip.total_number_steps:>6} {metrics['num_steps']:>8} {t_build*1e3:>11.1f} {t_metrics*1e3:>13.2f}")
+	
+	if num_mismatch > 0:
+		print(f"calc_metrics() disagrees with build() for {num_mismatch} designs!")
+		sys.exit(1)
+	
+	print("calc_metrics() agrees with build() for all designs.")
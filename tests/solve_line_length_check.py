@@ -0,0 +1,94 @@
+import os
+import sys
+import glob
+import json
+import time
+import logging
+from spiralator.core import ChipDesign
+
+# Round trip check for ChipDesign.solve_line_length() on every shipped spiral
+# design. Each design is built, and its total_line_length is handed back to the
+# solver with the design's own number of rotations. The solver should find the
+# design's vertical stretch. The solver is then run again over all rotation
+# counts, and the selected parameters are built to check the line length of the
+# resulting chip.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+tolerance_um = 1
+
+def is_spiral_design(conf:str):
+	''' Returns true if conf is a chip design file with a spiral. '''
+
+	try:
+		with open(conf) as f:
+			data = json.load(f)
+	except Exception:
+		return False
+
+	return isinstance(data, dict) and 'faux_cpw_taper' in data.get('io', {}) and data.get('spiral', {}).get('num_rotations', 0) != 0
+
+def built_length(conf:str, spiral:dict=None):
+	''' Builds the design, optionally replacing spiral parameters, and returns
+	total_line_length. '''
+
+	chip = ChipDesign()
+	chip.read_conf(conf)
+	if spiral is not None:
+		chip.spiral.update(spiral)
+	chip.build()
+
+	return chip.total_line_length
+
+if __name__ == "__main__":
+
+	logging.getLogger().setLevel(logging.CRITICAL)
+
+	confs = [c for c in sorted(glob.glob(os.path.join(REPO_PATH, "**", "*.json"), recursive=True)) if is_spiral_design(c)]
+
+	print(f"{'design':>40} {'rotations':>10} {'stretch (um)':>13} {'solved (um)':>12} {'any rot.':>9} {'built err (um)':>15} {'solve (ms)':>11}")
+
+	num_mismatch = 0
+	for conf in confs:
+
+		chip = ChipDesign()
+		chip.read_conf(conf)
+
+		# Skip older designs which no longer build
+		try:
+			target = built_length(conf)
+		except Exception as e:
+			print(f"{os.path.basename(conf)[:40]:>40} skipped, failed to build ({e})")
+			continue
+
+		# Same number of rotations as the design
+		solution = chip.solve_line_length(target, num_rotations=[chip.spiral['num_rotations']], tolerance_um=tolerance_um)
+		solved_str = "-"
+		if solution is None or abs(solution['vert_stretch_um'] - chip.spiral['vert_stretch_um']) > 1e-3:
+			num_mismatch += 1
+		if solution is not None:
+			solved_str = f"{solution['vert_stretch_um']:.3f}"
+
+		# Any number of rotations, checked by building the selected design
+		t0 = time.perf_counter()
+		solution = chip.solve_line_length(target, tolerance_um=tolerance_um)
+		t_solve = time.perf_counter() - t0
+
+		any_str = "-"
+		err_str = "-"
+		if solution is None:
+			num_mismatch += 1
+		else:
+			any_str = str(solution['num_rotations'])
+			err = built_length(conf, {'num_rotations': solution['num_rotations'], 'vert_stretch_um': solution['vert_stretch_um']}) - target
+			err_str = f"{err:.4f}"
+			if abs(err) > tolerance_um:
+				num_mismatch += 1
+
+		print(f"{os.path.basename(conf)[:40]:>40} {chip.spiral['num_rotations']:>10} {chip.spiral['vert_stretch_um']:>13.3f} {solved_str:>12} {any_str:>9} {err_str:>15} {t_solve*1e3:>11.1f}")
+
+	if num_mismatch > 0:
+		print(f"solve_line_length() failed to reproduce {num_mismatch} designs!")
+		sys.exit(1)
+	
+	print("solve_line_length() reproduced all designs.")
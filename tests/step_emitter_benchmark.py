@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import gdstk
+import logging
+from spiralator.core import ChipDesign
+
+# Compares the FLEXPATH and POLYGON step emitters on the Series 3.1 stepped
+# spiral chips. For each model, the chip is built with both emitters and the
+# vertex count and time to produce the final polygons are reported. FlexPath
+# only generates polygons when the design is written, so its polygon conversion
+# time is reported separately. The area where the two outputs differ is also
+# reported as a check that the emitters agree. The joins differ slightly, but
+# a single step tapered over its whole length already differs by several um^2.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+conf_2 = os.path.join(REPO_PATH, "series_3", "Series 3.1", "KIFM_Ser3_1_Trace_2.json")
+
+model_names = ["A", "B", "C", "D", "E"]
+widths = [2.9, 3.2, 3.5, 3.9, 4.3]
+ZL_widths = [3.7, 4, 4.4, 4.9, 5.4]
+ZH_widths = [2.4, 2.6, 2.85, 3.2, 3.6]
+num_repeats = 5
+max_region_um2 = 0.1
+
+def build_line(emitter:str, tlin_width:float, ZL_width:float, ZH_width:float):
+	''' Builds the chip and returns the stepped line polygons with timings. '''
+
+	t_build = 0
+	t_poly = 0
+	for i in range(num_repeats):
+		chip = ChipDesign()
+		chip.read_conf(conf_2)
+		chip.configure_steps(ZL_width_um=ZL_width, ZH_width_um=ZH_width, ZL_length_um=16, ZH_length_um=270, emitter=emitter)
+		chip.tlin['Wcenter_um'] = tlin_width
+		chip.io['faux_cpw_taper']['cpw_widths_um'] = [tlin_width]
+		chip.update()
+
+		t0 = time.perf_counter()
+		chip.build()
+		t_build += time.perf_counter() - t0
+
+		t0 = time.perf_counter()
+		if isinstance(chip.path, gdstk.FlexPath):
+			polys = chip.path.to_polygons()
+		else:
+			polys = [chip.path]
+		t_poly += time.perf_counter() - t0
+
+	return polys, t_build/num_repeats, t_poly/num_repeats, chip.total_number_steps
+
+def differences(polys_a:list, polys_b:list):
+	''' Returns the regions covered by only one of the two sets of polygons. '''
+
+	return gdstk.boolean(polys_a, polys_b, "not") + gdstk.boolean(polys_b, polys_a, "not")
+
+if __name__ == "__main__":
+
+	logging.getLogger().setLevel(logging.ERROR)
+
+	print(f"{'model':>6} {'steps':>6} {'emitter':>9} {'vertices':>9} {'build (ms)':>11} {'polygons (ms)':>14} {'diff (um^2)':>12}")
+
+	failures = []
+	for model, w, wl, wh in zip(model_names, widths, ZL_widths, ZH_widths):
+
+		results = {}
+		for emitter in ["FLEXPATH", "POLYGON"]:
+			results[emitter] = build_line(emitter, w, wl, wh)
+
+		diff = differences(results["FLEXPATH"][0], results["POLYGON"][0])
+		diff_area = sum(p.area() for p in diff)
+
+		for emitter, (polys, t_build, t_poly, num_steps) in results.items():
+			num_vertices = sum(p.size for p in polys)
+			print(f"{model:>6} {num_steps:>6} {emitter:>9} {num_vertices:>9} {t_build*1e3:>11.2f} {t_poly*1e3:>14.2f} {diff_area:>12.3f}")
+
+		for p in diff:
+			if p.area() > max_region_um2:
+				(x0, y0), (x1, y1) = p.bounding_box()
+				failures.append(f"model {model}: {p.area():.3f} um^2 near ({(x0+x1)/2:.1f}, {(y0+y1)/2:.1f})")
+
+	if failures:
+		print(f"\nEmitters differ by more than {max_region_um2} um^2 in {len(failures)} regions:")
+		for failure in failures:
+			print(f"  {failure}")
+		sys.exit(1)
+
+	print(f"\nEmitters agree: no region differs by more than {max_region_um2} um^2.")
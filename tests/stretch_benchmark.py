@@ -0,0 +1,121 @@
+import time
+import numpy as np
+from spiralator.core import carry_sign, stretch_path
+
+# Benchmarks the spiral stretching stage of ChipDesign.build_standard() for
+# increasing numbers of rotations. The stretch pass should scale linearly
+# with the number of points, so the time per point should stay roughly
+# constant as the number of rotations grows. For smaller spirals the old
+# insert-and-shift algorithm is also timed and checked against the new one.
+
+PI = 3.1415926535
+
+points_per_rotation = 150
+spacing_um = 50
+diameter_um = 200
+vert_stretch_um = 3400
+horiz_stretch_um = 350
+legacy_max_rotations = 150
+
+def make_spiral(num_rotations:int):
+	''' Builds an unstretched double spiral with circle reversals, matching the
+	layout used by build_standard(). '''
+
+	spiral_num = num_rotations//2
+	spiral_b = spacing_um/PI
+	num_points = points_per_rotation*num_rotations
+
+	theta1 = np.linspace(PI, PI+2*PI*spiral_num, num_points//2)
+	R1 = (theta1-PI)*spiral_b + diameter_um
+	theta2 = np.linspace(PI, PI+2*PI*spiral_num, num_points//2)
+	R2 = (theta2-PI)*spiral_b + diameter_um
+
+	path1 = np.column_stack((R1*np.cos(theta1), R1*np.sin(theta1)))[::-1]
+	path2 = np.column_stack((-1*R2*np.cos(theta2), -1*R2*np.sin(theta2)))
+
+	theta_c1 = np.linspace(0, PI, 150)
+	theta_c2 = np.linspace(PI, 2*PI, 150)
+	circ1 = np.column_stack((diameter_um/2*np.cos(theta_c1)-diameter_um/2, diameter_um/2*np.sin(theta_c1)))[::-1]
+	circ2 = np.column_stack((diameter_um/2*np.cos(theta_c2)+diameter_um/2, diameter_um/2*np.sin(theta_c2)))
+
+	tail_1 = np.array([[path1[0, 0], path1[0, 1]-10]])
+	tail_2 = np.array([[path2[-1, 0], path2[-1, 1]+10]])
+
+	path = np.concatenate((tail_1, path1, circ1, circ2, path2, tail_2))
+	markers = [1+len(path1)+len(circ1), 1+len(path1), 1+len(path1)+len(circ1)+len(circ2)]
+
+	return path, markers
+
+def stretch(path, markers):
+	''' Runs the vertical and horizontal stretch passes. '''
+
+	signs = carry_sign(np.diff(path[:, 0]), np.diff(path[:, 0]) == 0, 0)
+	path = stretch_path(path, vert_stretch_um, 1, signs, markers, force_marker=0)
+
+	dY = np.diff(path[:, 1])
+	signs = carry_sign(dY, np.abs(dY) < 0.01, np.sign(path[2, 1]-path[0, 1]))
+	path = stretch_path(path, horiz_stretch_um, 0, signs, markers, halve_markers=(1, 2))
+
+	return path
+
+def legacy_vertical_stretch(path_list, idx_reversal_pt):
+	''' Original O(turns x points) vertical stretch pass, for comparison. '''
+
+	last_sdX = 0
+	idx = 0
+	while True:
+		idx += 1
+		if idx >= len(path_list):
+			break
+
+		if path_list[idx][0] - path_list[idx-1][0] == 0:
+			sdX = last_sdX
+		else:
+			sdX = (path_list[idx][0] - path_list[idx-1][0])/abs(path_list[idx][0] - path_list[idx-1][0])
+
+		if (last_sdX != sdX) or (idx == idx_reversal_pt):
+			path_list.insert(idx, [path_list[idx-1][0], path_list[idx-1][1]])
+
+			dY = (path_list[idx][1]-path_list[idx-1][1])
+			sign_incr = 1
+			while abs(dY) < 0.1:
+				sign_incr += 1
+				dY = (path_list[idx][1]-path_list[idx-sign_incr][1])
+			sign_val = dY/abs(dY)
+
+			for si in range(idx, len(path_list)):
+				path_list[si][1] += vert_stretch_um * sign_val
+
+			idx += 1
+			if idx < idx_reversal_pt:
+				idx_reversal_pt += 1
+			last_sdX = sdX
+
+	return path_list
+
+if __name__ == "__main__":
+
+	print(f"{'rotations':>10} {'points':>10} {'stretch (ms)':>14} {'us/point':>10} {'legacy (ms)':>12}")
+
+	for num_rotations in [20, 50, 100, 150, 250, 500, 750, 1000]:
+
+		path, markers = make_spiral(num_rotations)
+
+		t0 = time.perf_counter()
+		stretched = stretch(path, list(markers))
+		t_new = time.perf_counter() - t0
+
+		# Time the legacy vertical pass and verify the new pass matches it
+		legacy_str = "-"
+		if num_rotations <= legacy_max_rotations:
+			t0 = time.perf_counter()
+			legacy = legacy_vertical_stretch(path.tolist(), markers[0])
+			t_legacy = time.perf_counter() - t0
+			legacy_str = f"{t_legacy*1e3:.1f}"
+
+			signs = carry_sign(np.diff(path[:, 0]), np.diff(path[:, 0]) == 0, 0)
+			vert_only = stretch_path(path, vert_stretch_um, 1, signs, list(markers), force_marker=0)
+			if vert_only.shape != (len(legacy), 2) or np.max(np.abs(vert_only - np.array(legacy))) > 1e-6:
+				print(f"Mismatch against legacy stretch at {num_rotations} rotations!")
+
+		print(f"{num_rotations:>10} {len(stretched):>10} {t_new*1e3:>14.2f} {t_new/len(stretched)*1e6:>10.3f} {legacy_str:>12}")
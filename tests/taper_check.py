@@ -0,0 +1,158 @@
+import os
+import sys
+import logging
+import numpy as np
+from spiralator.core import ChipDesign, TAPER_TYPES, taper_profile, taper_widths
+
+# Checks the taper profiles of taper_profile() and taper_widths(), and the
+# continuation of the taper into the steps of a through line by
+# ChipDesign.taper_step_widths().
+#
+# Every profile should run from the pad width to the line width and give the
+# same widths for scalar and array distances. LINEAR should match the original
+# scalar calc_taper_width(). The Klopfenstein profile stands in log-width for
+# log-impedance, so its reflection, including the jumps at each end, should
+# stay at or below max_ripple everywhere in the passband.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+tapers = [(15, 3, 1000, 0.05), (15, 3, 1000, 0.01), (3, 40, 250, 0.05)]
+
+def linear_width(start_width_um:float, end_width_um:float, length_um:float, z:float):
+	''' Width of a LINEAR taper as calculated by the original calc_taper_width(). '''
+	
+	slope = (start_width_um - end_width_um)/length_um
+	if z >= length_um:
+		return end_width_um
+	return start_width_um - slope*z
+
+def passband_reflection(profile:dict, num_points:int=50000):
+	''' Returns the largest reflection of a Klopfenstein profile in its passband,
+	treating log-width as log-impedance. '''
+	
+	w0 = profile['start_width_um']
+	w1 = profile['end_width_um']
+	L = profile['length_um']
+	A = np.arccosh(max(abs(np.log(w1/w0)/2)/profile['max_ripple'], 1))
+	
+	# Changes in log-width, including the jumps at each end
+	z = np.linspace(0, L, num_points+1)[:-1]
+	log_w = np.log(taper_widths(profile, z))
+	steps = np.diff(np.concatenate(([np.log(w0)], log_w, [np.log(w1)])))
+	z_steps = np.concatenate(([0], (z[1:] + z[:-1])/2, [L]))
+	
+	gamma = [np.abs(np.sum(steps*np.exp(-2j*beta_L*z_steps/L)))/2 for beta_L in np.linspace(A, 10*A, 500)[1:]]
+	
+	return max(gamma)
+
+def check_profiles():
+	''' Checks every taper type. Returns the number of failed checks. '''
+	
+	num_fail = 0
+	for w0, w1, L, ripple in tapers:
+		for ttype in TAPER_TYPES:
+			
+			profile = taper_profile(ttype, w0, w1, L, ripple)
+			profile['max_ripple'] = ripple
+			
+			z = np.linspace(-10, L + 10, 2001)
+			widths = taper_widths(profile, z)
+			scalar_widths = np.array([taper_widths(profile, zz) for zz in z])
+			
+			checks = {}
+			checks['scalar'] = np.allclose(widths, scalar_widths, rtol=1e-12, atol=0)
+			checks['end'] = np.all(widths[z >= L] == w1)
+			checks['monotonic'] = np.all(np.diff(widths)*np.sign(w1 - w0) >= -1e-12)
+			
+			if ttype == "NONE":
+				checks['start'] = np.all(widths == w1)
+			elif ttype == "KLOPFENSTEIN":
+				
+				# Log of width is antisymmetric about the center of the taper
+				zz = np.linspace(0, L, 1001)[1:-1]
+				log_sum = np.log(taper_widths(profile, zz)) + np.log(taper_widths(profile, L - zz))
+				checks['symmetric'] = np.allclose(log_sum, np.log(w0*w1))
+				checks['ripple'] = passband_reflection(profile) <= ripple*(1 + 1e-3)
+			else:
+				checks['start'] = np.isclose(taper_widths(profile, 0), w0)
+			
+			if ttype == "LINEAR":
+				checks['original'] = np.allclose(widths[z >= 0], [linear_width(w0, w1, L, zz) for zz in z[z >= 0]])
+			
+			failed = [k for k, v in checks.items() if not v]
+			num_fail += len(failed)
+			
+			print(f"{ttype:>14} {w0:>5} -> {w1:<5} {L:>6} um {ripple:>6} {'ok' if len(failed) < 1 else 'FAILED: ' + ', '.join(failed)}")
+	
+	return num_fail
+
+def check_step_widths():
+	''' Builds a stepped through line with and without tapering into the steps,
+	and compares the widths passed to taper_step_widths() with those it returns.
+	Returns the number of failed checks. '''
+	
+	num_fail = 0
+	for ttype in ["LINEAR", "RAISED_COSINE", "KLOPFENSTEIN"]:
+		
+		chip = ChipDesign()
+		chip.read_conf(os.path.join(REPO_PATH, "scirpts", "designs", "KIFM_Ser3_1_Tr1_v3.json"))
+		chip.configure_steps(ZL_width_um=4.4, ZH_width_um=2.85, ZL_length_um=16, ZH_length_um=270, taper_into_steps=True)
+		chip.io['taper']['type'] = ttype
+		chip.io['pads']['taper_width_um'] = 15
+		
+		# Record the lines passed through taper_step_widths()
+		calls = []
+		taper_step_widths = chip.taper_step_widths
+		def record(point_list, width_list, pad_y):
+			points, widths = taper_step_widths(point_list, width_list, pad_y)
+			calls.append((np.array(point_list), np.array(width_list), pad_y, points, widths))
+			return points, widths
+		chip.taper_step_widths = record
+		
+		chip.build()
+		
+		for points_in, widths_in, pad_y, points, widths in calls:
+			
+			dist = np.abs(points[:, 1] - pad_y)
+			dist_in = np.abs(points_in[:, 1] - pad_y)
+			taper_length = chip.io['taper']['length_um']
+			segment = chip.io['taper']['segment_length_um']
+			
+			# Every original point is kept in order, with its width scaled by the
+			# taper. The steps step back slightly, so distance is not monotonic.
+			idx = np.array([np.argmin(np.abs(points[:, 1] - y)) for y in points_in[:, 1]])
+			scale = chip.calc_taper_width(dist_in)/chip.tlin['Wcenter_um']
+			
+			checks = {}
+			checks['order'] = np.all(np.diff(idx) > 0) and idx[-1] == len(points) - 1 and dist[-1] == 0
+			checks['kept'] = np.allclose(points[idx], points_in, rtol=0, atol=1e-9)
+			checks['widths'] = np.allclose(widths[idx], widths_in*scale)
+			checks['pad width'] = np.isclose(widths[-1], chip.calc_taper_width(0)*widths_in[-1]/chip.tlin['Wcenter_um'])
+			
+			# Sample points at least every taper segment along the taper
+			on_taper = np.flatnonzero(dist <= taper_length)
+			checks['sampling'] = np.all(np.abs(np.diff(dist[on_taper[0]:])) <= segment + 1e-9)
+			
+			# Widths between original points follow the steps scaled by the taper
+			unscaled = widths/(chip.calc_taper_width(dist)/chip.tlin['Wcenter_um'])
+			between = [np.all((unscaled[a:b+1] - min(widths_in[i], widths_in[i+1]) >= -1e-9) & (unscaled[a:b+1] - max(widths_in[i], widths_in[i+1]) <= 1e-9)) for i, (a, b) in enumerate(zip(idx[:-1], idx[1:]))]
+			checks['interpolated'] = all(between)
+			
+			failed = [k for k, v in checks.items() if not v]
+			num_fail += len(failed)
+			
+			print(f"{ttype:>14} steps to y = {pad_y:>8} {len(points_in):>4} -> {len(points):>4} points {'ok' if len(failed) < 1 else 'FAILED: ' + ', '.join(failed)}")
+	
+	return num_fail
+
+if __name__ == "__main__":
+	
+	logging.getLogger().setLevel(logging.CRITICAL)
+	
+	num_fail = check_profiles() + check_step_widths()
+	
+	if num_fail > 0:
+		print(f"{num_fail} taper checks failed!")
+		sys.exit(1)
+	
+	print("All taper checks passed.")
@@ -0,0 +1,113 @@
+import os
+import sys
+import logging
+import gdstk
+import numpy as np
+from spiralator.core import ChipDesign
+
+# Checks that text placed with use_text_cells gives the same layout as text
+# placed directly, both as metal and engraved into the ground plane, by
+# flattening each chip and comparing every layer. The returned bounding boxes
+# should also match. Rotated chips are compared to the flat layout rotated
+# after it is built. One label overlaps another and one runs off the chip, so
+# those lines must fall back to direct engraving.
+#
+# Engraved text cells are cut on the grid gdstk's booleans snap to in the cell,
+# and flat text on the same grid in the chip, so edges can move by up to one
+# grid step. Each region where the layouts differ must therefore be thinner, on
+# average, than max_sliver_um. A missing or refilled glyph is far wider.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DESIGN_PATH = os.path.join(REPO_PATH, "scirpts", "designs")
+FONT_PATH = os.path.join(REPO_PATH, "scirpts", "assets", "futura")
+
+designs = ["MC-2024Q1H-D3-AusfA.json", "KIFM_Ser3B_v2.json"]
+fonts = ["futura medium bt.ttf", "Futura Bold font.ttf", os.path.join("..", "..", "..", "tests", "Chicago.ttf")]
+rotations = [None, 3*np.pi/2]
+
+max_sliver_um = 2e-3
+max_bb_diff_um = 1e-9
+
+def build_labels(conf:str, font:str, use_text_cells:bool, on_gnd:bool, rotation:float=None):
+	''' Builds the design with a few labels. Returns the flattened polygons and
+	the bounding boxes returned for each label. '''
+	
+	chip = ChipDesign()
+	chip.read_conf(conf)
+	chip.graphics_on_gnd = on_gnd
+	chip.use_text_cells = use_text_cells
+	chip.build()
+	
+	font = os.path.join(FONT_PATH, font)
+	bbs = []
+	bbs.append(chip.insert_text_block(["KINETIC INDUCTANCE", "FREQUENCY CONVERTER", "SERIES-3.1 Mdl. A", "WIDTH = 3.5 µm"], (-1300, 1150), font, 125, 35, "CENTER"))
+	bbs.append(chip.insert_text((1000, -1000), "RIGHT Ω 0.1", font, 77.7, right_justify=True))
+	bbs.append(chip.insert_text((-1000, -1500), "LEFT $x^2$", font, 100))
+	bbs.append(chip.insert_text((-1250, 1130), "OVERLAP", font, 100))
+	bbs.append(chip.insert_text((chip.chip_size_um[0]/2 - 200, chip.chip_size_um[1]/2 - 60), "EDGE", font, 100))
+	
+	if rotation is not None:
+		chip.rotate(rotation, [0, 0])
+	
+	cell = gdstk.Cell("CHIP")
+	chip.apply_objects(cell)
+	
+	return cell.get_polygons(), bbs
+
+def layer_diff(polys_a:list, polys_b:list):
+	''' Returns the regions covered by only one of two lists of polygons, over
+	all layers. The two differences are taken separately, as gdstk can trace
+	parts of a XOR twice. '''
+	
+	diff = []
+	for layer in set(p.layer for p in polys_a) | set(p.layer for p in polys_b):
+		la = [p for p in polys_a if p.layer == layer]
+		lb = [p for p in polys_b if p.layer == layer]
+		diff += gdstk.boolean(la, lb, "not", precision=1e-4)
+		diff += gdstk.boolean(lb, la, "not", precision=1e-4)
+	
+	return diff
+
+def sliver_width(poly):
+	''' Returns the average width of a region, taking its length as the diagonal
+	of its bounding box. '''
+	
+	(x0, y0), (x1, y1) = poly.bounding_box()
+	
+	return poly.area()/np.hypot(x1 - x0, y1 - y0)
+
+if __name__ == "__main__":
+	
+	logging.getLogger().setLevel(logging.CRITICAL)
+	
+	print(f"{'design':>30} {'font':>22} {'on gnd':>7} {'rotated':>8} {'diff (um^2)':>11} {'sliver (um)':>12} {'bbox diff (um)':>15}")
+	
+	num_mismatch = 0
+	for design in designs:
+		conf = os.path.join(DESIGN_PATH, design)
+		for font in fonts:
+			for on_gnd in [False, True]:
+				for rotation in rotations:
+					
+					flat_polys, flat_bbs = build_labels(conf, font, False, on_gnd)
+					cell_polys, cell_bbs = build_labels(conf, font, True, on_gnd, rotation)
+					
+					if rotation is not None:
+						for p in flat_polys:
+							p.rotate(rotation, (0, 0))
+					
+					diff = layer_diff(flat_polys, cell_polys)
+					diff_area = sum(p.area() for p in diff)
+					sliver = max([sliver_width(p) for p in diff], default=0)
+					bb_diff = max(np.abs(np.array(a) - np.array(b)).max() for a, b in zip(flat_bbs, cell_bbs))
+					
+					if bb_diff > max_bb_diff_um or sliver > max_sliver_um:
+						num_mismatch += 1
+					
+					print(f"{design[:30]:>30} {os.path.basename(font)[:22]:>22} {str(on_gnd):>7} {str(rotation is not None):>8} {diff_area:>11.4f} {sliver:>12.2e} {bb_diff:>15.2e}")
+	
+	if num_mismatch > 0:
+		print(f"Text cells differ from the flat layout in {num_mismatch} cases!")
+		sys.exit(1)
+	
+	print("Text cells match the flat layout in all cases.")
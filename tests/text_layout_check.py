@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import logging
+import gdstk
+import numpy as np
+from matplotlib.textpath import TextPath
+from spiralator import core
+from spiralator.core import ChipDesign, render_text, lookup_font, path_polygons, polygons_bounding_box
+
+# Checks text rendered from cached glyph outlines (render_text()) against the
+# whole string rendered through matplotlib's TextPath, and the layout of
+# ChipDesign.insert_text_block(). Each line of a block should match the same
+# line placed with insert_text(), be justified to the block's position as
+# insert_text() always has, and lie within the returned bounding box.
+#
+# Holes are resolved with a boolean on a grid of a tenth of the tolerance. For
+# cached glyphs the grid is relative to each glyph rather than to the string,
+# so outlines can move by up to a grid step.
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FONT_PATH = os.path.join(REPO_PATH, "scirpts", "assets", "futura")
+
+fonts = ["futura medium bt.ttf", "Futura Bold font.ttf", "Futura Light font.ttf", os.path.join("..", "..", "..", "tests", "Chicago.ttf")]
+tolerance = 0.1
+labels = ["KINETIC INDUCTANCE", "FREQUENCY CONVERTER", "SERIES-3.2 Mdl. A", "WIDTH = 3.5 µm", "NO STEPS", "L = 1089.26 mm", "AV Wa To ffi"]
+sizes = [125, 77.7]
+
+def area_difference(polys_a:list, polys_b:list):
+	''' Returns the area covered by only one of two lists of polygons. '''
+	
+	return sum(p.area() for p in gdstk.boolean(polys_a, polys_b, "not", precision=1e-4)) + sum(p.area() for p in gdstk.boolean(polys_b, polys_a, "not", precision=1e-4))
+
+def perimeter(polys:list):
+	''' Returns the total perimeter of a list of polygons. '''
+	
+	return sum(np.sum(np.linalg.norm(np.diff(p.points, axis=0, append=p.points[:1]), axis=1)) for p in polys)
+
+def check_glyph_cache():
+	''' Compares render_text() with the full TextPath of each label, and checks a
+	second render only reads the glyph cache. Returns the number of failures. '''
+	
+	num_fail = 0
+	for font in fonts:
+		font = os.path.join(FONT_PATH, font)
+		for size in sizes:
+			for label in labels:
+				
+				position = (123.4, -56.7)
+				
+				t0 = time.perf_counter()
+				cached = render_text(label, size, position, font, tolerance, layer=0)
+				t_first = time.perf_counter() - t0
+				
+				num_glyphs = len(core.glyph_cache)
+				t0 = time.perf_counter()
+				again = render_text(label, size, position, font, tolerance, layer=0)
+				t_again = time.perf_counter() - t0
+				
+				full = [gdstk.Polygon(p) for p in path_polygons(TextPath(position, label, size=size, prop=lookup_font(font)[1]), tolerance, x_start=position[0])]
+				
+				diff = area_difference(cached, full)/perimeter(full)
+				same_again = len(core.glyph_cache) == num_glyphs and all(np.array_equal(a.points, b.points) for a, b in zip(cached, again))
+				
+				if diff > 0.1*tolerance or not same_again:
+					num_fail += 1
+				
+				print(f"{os.path.basename(font)[:22]:>22} {size:>6} {label:>20} {diff:>10.2e} {'cached' if same_again else 'NOT CACHED':>10} {t_first*1e3:>8.2f} {t_again*1e3:>8.2f}")
+	
+	return num_fail
+
+def check_blocks():
+	''' Places each label block with insert_text_block() and line by line with
+	insert_text(), with every justification. Returns the number of failures. '''
+	
+	num_fail = 0
+	for font in fonts:
+		font = os.path.join(FONT_PATH, font)
+		for justify in ["LEFT", "CENTER", "RIGHT"]:
+			
+			position = (-1300.5, 1150.25)
+			size = 125
+			gap = 35
+			
+			block = ChipDesign()
+			block_bb = block.insert_text_block(labels, position, font, size, gap, justify)
+			
+			lines = ChipDesign()
+			line_bbs = [lines.insert_text((position[0], position[1] - idx*(size + gap)), label, font, size, center_justify=(justify == "CENTER"), right_justify=(justify == "RIGHT")) for idx, label in enumerate(labels)]
+			
+			checks = {}
+			checks['lines'] = area_difference(block.text_obj_list, lines.text_obj_list) == 0
+			checks['bbox'] = np.allclose(block_bb, polygons_bounding_box(block.text_obj_list))
+			checks['line bbox'] = np.allclose(block_bb, ((min(b[0][0] for b in line_bbs), min(b[0][1] for b in line_bbs)), (max(b[1][0] for b in line_bbs), max(b[1][1] for b in line_bbs))))
+			
+			# Each line is shifted left from its LEFT placement by its width (RIGHT)
+			# or half its width (CENTER)
+			shift = {"LEFT": 0, "CENTER": 0.5, "RIGHT": 1}[justify]
+			left_bbs = [polygons_bounding_box(render_text(label, size, font_path=font, layer=0)) for label in labels]
+			expected = [position[0] + bb[0][0] - shift*(bb[1][0] - bb[0][0]) for bb in left_bbs]
+			checks['justified'] = np.allclose([bb[0][0] for bb in line_bbs], expected, rtol=0, atol=1e-9)
+			
+			failed = [k for k, v in checks.items() if not v]
+			num_fail += len(failed)
+			
+			print(f"{os.path.basename(font)[:22]:>22} {justify:>7} {'ok' if len(failed) < 1 else 'FAILED: ' + ', '.join(failed)}")
+	
+	return num_fail
+
+if __name__ == "__main__":
+	
+	logging.getLogger().setLevel(logging.CRITICAL)
+	
+	print(f"{'font':>22} {'size':>6} {'label':>20} {'diff (um)':>10} {'cache':>10} {'1st (ms)':>8} {'2nd (ms)':>8}")
+	num_fail = check_glyph_cache()
+	num_fail += check_blocks()
+	
+	if num_fail > 0:
+		print(f"{num_fail} text layout checks failed!")
+		sys.exit(1)
+	
+	print("All text layout checks passed.")